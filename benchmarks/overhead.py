@@ -0,0 +1,98 @@
+"""
+Measure the overhead dovpanda adds to common pandas hot paths.
+
+Every workload runs on the same data with the original pandas methods (after `dovpanda.shutdown()`)
+and with dovpanda hooks (after `dovpanda.start()`), and the relative overhead is reported per workload
+and frame size, followed by the per hooked method and per hint timings from `dovpanda.stats()`.
+
+Usage::
+
+    python benchmarks/overhead.py
+    python benchmarks/overhead.py --rows 10000 1000000 --repeat 5
+"""
+import argparse
+import os
+import tempfile
+import timeit
+
+import numpy as np
+import pandas as pd
+
+import dovpanda
+
+
+def make_frame(rows):
+    rng = np.random.RandomState(0)
+    return pd.DataFrame({'key': rng.randint(0, 100, rows),
+                         'value': rng.rand(rows),
+                         'label': rng.choice(['bear', 'panda', 'koala'], rows),
+                         'day': pd.date_range('2019-01-01', periods=rows, freq='s').astype(str)})
+
+
+def scalar_getitem(df, csv_path):
+    for i in range(1000):
+        df.loc[i, 'value']
+
+
+def read_csv(df, csv_path):
+    pd.read_csv(csv_path)
+
+
+def repeated_concat(df, csv_path):
+    chunk = df.iloc[:100]
+    res = chunk
+    for _ in range(50):
+        res = pd.concat([res, chunk])
+
+
+def groupby(df, csv_path):
+    df.groupby('key').value.sum()
+
+
+def equality(df, csv_path):
+    for _ in range(100):
+        df == df
+
+
+WORKLOADS = [scalar_getitem, read_csv, repeated_concat, groupby, equality]
+
+
+def best_time(workload, df, csv_path, repeat):
+    return min(timeit.repeat(lambda: workload(df, csv_path), number=1, repeat=repeat))
+
+
+def run(rows_list, repeat):
+    results = []
+    for rows in rows_list:
+        df = make_frame(rows)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            csv_path = os.path.join(tmp_dir, 'data.csv')
+            df.to_csv(csv_path, index=False)
+            for workload in WORKLOADS:
+                dovpanda.shutdown()
+                plain = best_time(workload, df, csv_path, repeat)
+                dovpanda.start()
+                hooked = best_time(workload, df, csv_path, repeat)
+                results.append({'workload': workload.__name__, 'rows': rows, 'pandas': plain,
+                                'dovpanda': hooked, 'overhead': hooked / plain - 1})
+    return pd.DataFrame(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000],
+                        help='Frame sizes to run every workload on')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement, the best one is kept')
+    args = parser.parse_args()
+
+    dovpanda.set_output(lambda teller: None)  # Hints run in full, but don't flood the terminal
+    dovpanda.set_profiling()
+    results = run(args.rows, args.repeat)
+    with pd.option_context('display.width', 120, 'display.max_rows', 100):
+        print(results.to_string(index=False, float_format='{:.4f}'.format))
+        print()
+        print(dovpanda.stats().to_string(float_format='{:.6f}'.format))
+
+
+if __name__ == '__main__':
+    main()
@@ -24,6 +24,66 @@ def shutdown():
 mute = ledger.mute
 
 
+def set_background(enabled=True, workers=None):
+    """Run read only post hints (e.g. after `pd.read_csv`) on a thread pool instead of before returning the result"""
+    ledger.set_background(enabled, workers)
+
+
+def set_memory_size(size):
+    """Tell about a repeated call from the same line only once among the latest `size` hooked calls"""
+    ledger.set_memory_size(size)
+
+
+def set_profiling(enabled=True):
+    """Record how many times each hooked pandas method and each hint ran, and how long dovpanda took on them"""
+    ledger.set_profiling(enabled)
+
+
+def stats():
+    """
+    Timings recorded since `set_profiling` was called, as a DataFrame.
+    For hooked methods the times exclude the pandas method itself: `frame` is the time spent capturing
+    the call site and `binding` the time spent binding its arguments. Times are in seconds
+    """
+    return ledger.stats()
+
+
+def reset_stats():
+    ledger.reset_stats()
+
+
+def wait(timeout=None):
+    """Wait for hints running in the background to tell"""
+    ledger.wait(timeout)
+
+
+def set_collecting(enabled=True, path=None):
+    """
+    Collect the hints of worker processes (e.g. of `multiprocessing` or `concurrent.futures` pools) started from now
+    on, instead of each of them telling its own. They are written as events to files under `path`,
+    a new temporary directory by default. Returns the path
+    """
+    return ledger.set_collecting(enabled, path)
+
+
+def collected():
+    """
+    Hints collected from worker processes as a DataFrame, one row per hint and line of code, with the number of times
+    it was told, the number of processes that told it and the seconds the hinted calls took, where measured
+    """
+    return ledger.collected()
+
+
+def report():
+    """Tell a single summary of the hints collected from worker processes, and return them as in `collected`"""
+    return ledger.report()
+
+
+def add_restricted_dirs(*dir_names):
+    """Don't hint on pandas calls made from files under `dir_names`, e.g. internal wrapper libraries"""
+    ledger.add_restricted_dirs(*dir_names)
+
+
 def tip():
     return tips.random_tip()
 
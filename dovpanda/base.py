@@ -1,11 +1,27 @@
 import ast
+import atexit
+import copy
 import functools
 import inspect
+import json
+import linecache
+import os
 import re
+import shutil
 import sys
-from collections import defaultdict, deque
+import tempfile
+import threading
+import time
+import types
+import weakref
+from collections import Counter, defaultdict, deque, namedtuple
+from collections.abc import Iterator, Mapping, Sequence
+from concurrent import futures
 from contextlib import contextmanager
 from itertools import chain
+
+import numpy as np
+
 from dovpanda import config
 
 try:  # If user runs from notebook they will have this
@@ -15,14 +31,24 @@ except (ModuleNotFoundError, ImportError):
 
 
 class Hint:
-    def __init__(self, original, hook_type, replacement, *, stop_nudge=1):
+    def __init__(self, original, hook_type, replacement, *, stop_nudge=1, reads=None, on_large='full',
+                 background=False, wraps_result=False):
         accepted_hooks = ['pre', 'post']
         assert hook_type in accepted_hooks, f'hook_type must be one of {accepted_hooks}'
+        accepted_on_large = ['full', 'sample', 'skip']
+        assert on_large in accepted_on_large, f'on_large must be one of {accepted_on_large}'
+        assert not wraps_result or (hook_type == 'post' and on_large == 'full' and not background), \
+            'Only a full, foreground post hint can wrap the result'
 
         self.original = original
         self.hook_type = hook_type
         self.replacement = replacement
         self.stop_nudge = stop_nudge
+        self.reads = None if reads is None else setify(reads)  # None means all arguments
+        self.on_large = on_large  # What a post hint does with results above its row limit
+        self.max_rows = None  # Set after the hint was too slow on a result that large
+        self.background = background  # Read only post hint that may run off the caller's thread
+        self.wraps_result = wraps_result  # Post hint returns what the hooked call returns, e.g. a watched iterator
 
     def __repr__(self):
         return (f"[HINT] Hooks on {self.original} with {self.replacement} "
@@ -31,13 +57,335 @@ class Hint:
     def __str__(self):
         return (f'{self.replacement.__name__} hooks on {self.original}')
 
+    def row_limit(self):
+        limit = float('inf') if self.on_large == 'full' else config.HINT_ROW_BUDGET
+        if self.max_rows is not None:
+            limit = min(limit, self.max_rows)
+        return limit
+
+
+class Binder:
+    """Map call arguments of `f` to its parameter names.
+    The signature is described once, and only the parameters in `names` are bound on each call"""
+    NO_DEFAULT, STORED_DEFAULT, LIVE_DEFAULT = range(3)
+
+    def __init__(self, f, names=None, layout=None):
+        if layout is None:
+            layout = self.describe(f)
+        positional = [name for name, kind, _, _ in layout
+                      if kind in (inspect.Parameter.POSITIONAL_ONLY, inspect.Parameter.POSITIONAL_OR_KEYWORD)]
+        self.n_positional = len(positional)
+        self.var_positional = next((name for name, kind, _, _ in layout
+                                    if kind == inspect.Parameter.VAR_POSITIONAL), None)
+        self.var_keyword = next((name for name, kind, _, _ in layout
+                                 if kind == inspect.Parameter.VAR_KEYWORD), None)
+        self.keywords = {name for name, kind, _, _ in layout if kind != inspect.Parameter.VAR_KEYWORD}
+        bound = []
+        for name, kind, default_kind, default in layout:
+            if names is not None and name not in names:
+                continue
+            if default_kind == self.LIVE_DEFAULT:
+                default = inspect.signature(f).parameters[name].default
+            position = positional.index(name) if name in positional else None
+            bound.append((name, position, default))
+        self.bound = tuple(bound)
+        self.iterables = tuple((name, position) for name, position, _ in bound if name in config.ITERABLE_ARGUMENTS)
+        self.source_func_name = f.__name__
+
+    @classmethod
+    def describe(cls, f):
+        """Parameter layout of `f` as JSON friendly [name, kind, default_kind, default] lists.
+        Defaults that can't be stored as JSON are marked to be looked up live"""
+        try:
+            parameters = inspect.signature(f).parameters.values()
+        except (ValueError, TypeError):  # Some builtins have no signature
+            return []
+        layout = []
+        for p in parameters:
+            if p.default is p.empty:
+                layout.append([p.name, int(p.kind), cls.NO_DEFAULT, None])
+            elif type(p.default) in (type(None), bool, int, float, str):
+                layout.append([p.name, int(p.kind), cls.STORED_DEFAULT, p.default])
+            else:
+                layout.append([p.name, int(p.kind), cls.LIVE_DEFAULT, None])
+        return layout
+
+    def bind(self, args, kwargs):
+        arguments = {}
+        for name, position, default in self.bound:
+            if position is not None and position < len(args):
+                arguments[name] = args[position]
+            elif name in kwargs:
+                arguments[name] = kwargs[name]
+            elif name == self.var_positional:
+                arguments[name] = args[self.n_positional:]
+            elif name == self.var_keyword:
+                arguments[name] = {k: v for k, v in kwargs.items() if k not in self.keywords}
+            else:
+                arguments[name] = default
+        arguments['_dovpanda'] = {'source_func_name': self.source_func_name, 'args': args, 'kwargs': kwargs}
+        return arguments
+
+    def materialize(self, args, kwargs):
+        """Arguments with the one-shot iterators hints read turned into lists, so `f` still gets all of their items"""
+        for name, position in self.iterables:
+            if position is not None and position < len(args):
+                if isinstance(args[position], Iterator):
+                    args = args[:position] + (list(args[position]),) + args[position + 1:]
+            elif isinstance(kwargs.get(name), Iterator):
+                kwargs = dict(kwargs, **{name: list(kwargs[name])})
+        return args, kwargs
+
+
+class Stats:
+    """Facts about a pandas object (or a list of them) that hints share. Each one is computed at most once"""
+
+    def __init__(self, obj):
+        self.obj = obj
+        self.cache = dict()
+
+    def remember(self, key, compute):
+        """Value of `compute()`, computed only the first time `key` is asked for"""
+        if key not in self.cache:
+            self.cache[key] = compute()
+        return self.cache[key]
+
+    @property
+    def index_is_unique(self):
+        return self.obj.index.is_unique  # Cached by pandas on the index
+
+    @property
+    def columns_are_unique(self):
+        return self.obj.columns.is_unique
+
+    def nunique(self, col):
+        return self.remember(('nunique', col), lambda: self.obj[col].nunique())
+
+    def nunique_estimate(self, col):
+        """Estimate of `nunique(col)` in roughly constant time. It tends to be lower than the exact count"""
+        if ('nunique', col) in self.cache:
+            return self.cache[('nunique', col)]
+        return self.remember(('nunique_estimate', col),
+                             lambda: estimate_nunique(self.obj[col], config.CARDINALITY_SAMPLE_SIZE))
+
+    def column(self, col):
+        return self.remember(('column', col), lambda: np.asarray(self.obj[col]))
+
+    def bounds(self, col):
+        """Smallest and largest value of a numeric column, ignoring missing values"""
+        return self.remember(('bounds', col), lambda: (self.obj[col].min(), self.obj[col].max()))
+
+    def is_integral(self, col):
+        """Whether all the present values of a float column are whole numbers"""
+        def compute():
+            values = self.obj[col].to_numpy()
+            present = values[~np.isnan(values)]
+            return bool(np.all(np.mod(present, 1) == 0))
+        return self.remember(('is_integral', col), compute)
+
+    def fits_float32(self, col):
+        """Whether a float column keeps all of its values as float32"""
+        def compute():
+            values = self.obj[col].to_numpy()
+            return bool(np.all((values.astype(np.float32) == values) | np.isnan(values)))
+        return self.remember(('fits_float32', col), compute)
+
+    @property
+    def frames(self):
+        """Summary of a list of frames, see `summarize_frames`"""
+        return self.remember('frames', lambda: summarize_frames(self.obj))
+
+
+class CallStats:
+    """
+    Stats of the objects a single hooked call handles, shared between all of its pre and post hints.
+    They are not kept across calls: values change in place, even through a view of another object,
+    and no check cheaper than recomputing a fact tells that an object is unchanged
+    """
+
+    def __init__(self):
+        self.stats = dict()
+
+    def of(self, obj):
+        key = id(obj)  # Stats hold a reference, so the id is not reused during the call
+        if key not in self.stats:
+            self.stats[key] = Stats(obj)
+        return self.stats[key]
+
+
+class Memory:
+    """Sliding window of the latest calls, with a running count of each call in the window"""
+
+    def __init__(self, maxlen):
+        self.maxlen = maxlen
+        self.calls = deque()
+        self.counts = Counter()
+
+    def __len__(self):
+        return len(self.calls)
+
+    def __iter__(self):
+        return iter(self.calls)
+
+    def append(self, call):
+        """Remember `call` and return how many times it is in the window"""
+        self.calls.append(call)
+        self.counts[call] += 1
+        self._evict()
+        return self.counts[call]
+
+    def resize(self, maxlen):
+        self.maxlen = maxlen
+        self._evict()
+
+    def _evict(self):
+        while len(self.calls) > self.maxlen:
+            oldest = self.calls.popleft()
+            self.counts[oldest] -= 1
+            if not self.counts[oldest]:
+                del self.counts[oldest]
+
+
+class Profile:
+    """Call counts and wall times of hooked methods and of hints"""
+
+    def __init__(self, samples):
+        self.samples = samples  # Latest durations kept per record for percentiles
+        self.records = dict()
+        self.lock = threading.Lock()
+
+    def record(self, kind, name, elapsed, frame=0., binding=0.):
+        with self.lock:
+            record = self.records.get((kind, name))
+            if record is None:
+                record = self.records[(kind, name)] = {'calls': 0, 'total': 0., 'frame': 0., 'binding': 0.,
+                                                       'durations': deque(maxlen=self.samples)}
+            record['calls'] += 1
+            record['total'] += elapsed
+            record['frame'] += frame
+            record['binding'] += binding
+            record['durations'].append(elapsed)
+
+    def to_frame(self):
+        pd = sys.modules['pandas']
+        columns = ['kind', 'name', 'calls', 'total', 'mean', 'p50', 'p90', 'p99', 'frame', 'binding']
+        with self.lock:  # pandas calls below are hooked too, and record under the lock
+            records = [(key, dict(record, durations=list(record['durations'])))
+                       for key, record in self.records.items()]
+        rows = []
+        for (kind, name), record in records:
+            durations = pd.Series(record['durations'])
+            p50, p90, p99 = durations.quantile([.5, .9, .99])
+            rows.append([kind, name, record['calls'], record['total'], record['total'] / record['calls'],
+                         p50, p90, p99, record['frame'], record['binding']])
+        return (pd.DataFrame(rows, columns=columns)
+                .sort_values('total', ascending=False)
+                .reset_index(drop=True))
+
+
+class HintEvents:
+    """
+    Output of the teller in a worker process. Each hint told is appended as a compact JSON line to a file of
+    this process under `path`, with its message only the first time it is told from a line
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.pid = None
+        self.fd = None
+        self.described = set()  # Hints and lines already written with their message
+
+    def __call__(self, teller):
+        caller = teller.caller
+        event = {'hint': teller.hint, 'file': getattr(caller, 'filename', None),
+                 'line': getattr(caller, 'lineno', None), 'cost': teller.cost}
+        key = (event['hint'], event['file'], event['line'])
+        if key not in self.described:
+            self.described.add(key)
+            event['message'] = teller._strip_html(teller.message).strip()
+        if self.pid != os.getpid():  # First event, or this process was forked from one that wrote some
+            self.pid = os.getpid()
+            self.described = {key}
+            self.fd = os.open(os.path.join(self.path, f'{self.pid}.jsonl'), os.O_WRONLY | os.O_APPEND | os.O_CREAT)
+        os.write(self.fd, (json.dumps(event) + '\n').encode())  # A single appending write, threads don't interleave
+
+    @staticmethod
+    def read(path):
+        """Events written under `path`, counted per hint and line"""
+        records = {}
+        for name in sorted(os.listdir(path)):
+            if not name.endswith('.jsonl'):
+                continue
+            with open(os.path.join(path, name)) as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except ValueError:  # Still being written
+                        continue
+                    key = (event['hint'], event['file'], event['line'])
+                    record = records.setdefault(key, {'count': 0, 'processes': set(), 'cost': 0., 'message': None})
+                    record['count'] += 1
+                    record['processes'].add(name)
+                    record['cost'] += event['cost'] or 0
+                    record['message'] = record['message'] or event.get('message')
+        return records
+
+    @staticmethod
+    def to_frame(records):
+        pd = sys.modules['pandas']
+        columns = ['hint', 'filename', 'lineno', 'count', 'processes', 'cost', 'message']
+        rows = [[hint, filename, lineno, record['count'], len(record['processes']), record['cost'], record['message']]
+                for (hint, filename, lineno), record in records.items()]
+        return (pd.DataFrame(rows, columns=columns)
+                .sort_values(['cost', 'count'], ascending=False)
+                .reset_index(drop=True))
+
+
+class Caller(namedtuple('Caller', ['filename', 'lineno', 'code'])):
+    """Where a hooked pandas method was called from. The source line is read only when asked for"""
+    __slots__ = ()
+
+    @classmethod
+    def from_frame(cls, frame):
+        return cls(frame.f_code.co_filename, frame.f_lineno, frame.f_code)
+
+    @property
+    def code_context(self):
+        return [linecache.getline(self.filename, self.lineno)]
+
+
+class _ThreadAttribute:
+    """Teller attribute of which each thread sees its own value"""
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, teller, owner=None):
+        if teller is None:
+            return self
+        return getattr(teller.local, self.name, None)
+
+    def __set__(self, teller, value):
+        setattr(teller.local, self.name, value)
+
 
 class _Teller:
+    caller = _ThreadAttribute()
+    hint = _ThreadAttribute()  # Name of the hint that tells
+    cost = _ThreadAttribute()  # Seconds the hooked call took, once it returned
+
     def __init__(self):
         self.message = None
+        self.level = None
+        self.local = threading.local()  # Each thread tells about its own call
         self.set_output('display')
         self.verbose = True
-        self.caller = None
+
+    def snapshot(self):
+        """Copy of the teller that keeps pointing to the current call, whatever thread tells through it"""
+        teller = copy.copy(self)
+        teller.local = types.SimpleNamespace(caller=self.caller, hint=self.hint, cost=self.cost)
+        return teller
 
     def __repr__(self):
         trace = self.if_verbose(f'(Line {self.caller.lineno}) ')
@@ -65,6 +413,7 @@ class _Teller:
     def _strip_html(s):
         s = re.sub(r'\n', '', s)
         s = re.sub(r'<br>', r'\n', s)
+        s = re.sub(r'<li>', r'\n- ', s)
         s = re.sub(r' {2,}', r' ', s)
         return re.sub('<[^<]+?>', '', s)
 
@@ -100,11 +449,27 @@ class _Teller:
             self.output = self._no_output
         else:
             self.output = output_method
+        self.silent = self.output is self._no_output
 
     def tell(self, message, color='blue'):
-        self.level = config.color_to_level.get(color, 'blue')
-        self.message = message
-        self.output(self)
+        told = self.snapshot()  # Concurrent tells don't overwrite each other's message
+        told.level = config.color_to_level.get(color, 'blue')
+        told.message = message
+        self.output(told)
+
+
+class CallState(threading.local):
+    """
+    State of the hooked call the current thread is in. Each thread sees its own values, so calls running
+    concurrently on a thread pool neither mix up their details nor wait on each other for them
+    """
+
+    def __init__(self):
+        self.caller = None
+        self.similar = 0  # Calls from the same line to the same method among the latest calls
+        self.spent = 0  # Seconds spent on hints of the current call
+        self.memory = Memory(maxlen=config.MEMORY_SIZE)  # Latest calls of this thread only
+        self.teller = None  # Tells go through it instead of the ledger's teller when set
 
 
 class Ledger:
@@ -112,10 +477,36 @@ class Ledger:
         self.hints = defaultdict(list)
         self.teller = _Teller()
         self.verbose = True
-        self.caller = None
-        # TODO: Memory has a cache only of registered methods. Change to accomodate all pandas
-        self.memory = deque(maxlen=32)
+        self.local = CallState()
         self.original_methods = dict()
+        self.binders = dict()
+        self.executor = None  # Runs background hints when set
+        self.profile = None  # Records wrapper and hint timings when set
+        self.pending = set()
+        self.restricted_prefixes = ()
+        self.restricted_files = dict()  # Verdict per caller file, so each file is matched once
+        self.add_restricted_dirs(*config.RESTRICTED_DIRS)
+        self.collect_path = None  # Where worker processes write their hints, in the collecting process
+        self.collect_tempdir = None  # The collect path, when dovpanda made it and removes it
+        LEDGERS.add(self)
+        self.join_collector()
+
+    @property
+    def caller(self):
+        return self.local.caller
+
+    @property
+    def similar(self):
+        return self.local.similar
+
+    @property
+    def spent(self):
+        return self.local.spent
+
+    @property
+    def memory(self):
+        # TODO: Memory has a cache only of registered methods. Change to accomodate all pandas
+        return self.local.memory
 
     def __len__(self):
         hints_gen = chain.from_iterable(self.hints.values())
@@ -126,80 +517,336 @@ class Ledger:
         return len(set(hints_gen))
 
     def replace(self, original, func_hooks):
-        g = rgetattr(sys.modules['pandas'], original)
+        registry = config.REGISTRY
+        if original in registry['missing']:
+            return
+        try:
+            g = rgetattr(sys.modules['pandas'], original)
+        except AttributeError:  # Not in the installed pandas version
+            registry['missing'].append(original)
+            return
+        if original not in registry['layouts']:
+            registry['layouts'][original] = Binder.describe(g)
         self.save_original(original, g)
-        rsetattr(sys.modules['pandas'], original, self.attach_hooks(g, func_hooks))
+        rsetattr(sys.modules['pandas'], original,
+                 self.attach_hooks(g, func_hooks, registry['layouts'][original], name=original))
 
-    def add_hint(self, originals, hook_type='pre', stop_nudge=1):
+    def add_hint(self, originals, hook_type='pre', stop_nudge=1, reads=None, on_large='full', background=False,
+                 wraps_result=False):
 
         def replaces_decorator(replacement):
             hint = Hint(original=originals, hook_type=hook_type, replacement=replacement,
-                        stop_nudge=stop_nudge)
+                        stop_nudge=stop_nudge, reads=reads, on_large=on_large, background=background,
+                        wraps_result=wraps_result)
             for original in listify(originals):
                 self.hints[original].append(hint)
 
         return replaces_decorator
 
     def register_hints(self):
+        registry = config.REGISTRY
+        resolved = len(registry['layouts']) + len(registry['missing'])
         for original, func_hooks in self.hints.items():
             self.replace(original, func_hooks)
+        if len(registry['layouts']) + len(registry['missing']) != resolved:
+            config.save_registry(registry)
 
-    def attach_hooks(self, f, func_hooks):
+    def attach_hooks(self, f, func_hooks, layout=None, name=None):
         pres = [hook for hook in func_hooks if hook.hook_type == 'pre']
         posts = [hook for hook in func_hooks if hook.hook_type == 'post']
+        names = bound_names(func_hooks)
+        binder = None if config.LAZY_HOOKS else self.get_binder(f, names, layout)
+        max_nudge = max(hook.stop_nudge for hook in func_hooks)
+        name = name or f.__qualname__
 
         @functools.wraps(f)
         def run(*args, **kwargs):
+            nonlocal binder
+            if self.teller.silent:
+                return f(*args, **kwargs)
+            profile = self.profile
+            if profile is not None:
+                started = time.perf_counter()
             self._set_caller_details(f)
-            arguments = self._get_arguments(f, *args, **kwargs)
+            local = self.local
+            if self.is_restricted(local.caller.filename) or local.similar > max_nudge:  # No hint can fire
+                if profile is not None:
+                    captured = time.perf_counter() - started
+                    profile.record('hooked', name, captured, frame=captured)
+                return f(*args, **kwargs)
+            if profile is not None:
+                captured = time.perf_counter()
+            if binder is None:
+                binder = self.get_binder(f, names, layout)
+            if binder.iterables:
+                args, kwargs = binder.materialize(args, kwargs)
+            arguments = binder.bind(args, kwargs)
+            arguments['_dovpanda']['stats'] = CallStats()
+            if profile is not None:
+                bound = time.perf_counter()
+            local.spent = 0
+            self.teller.cost = None
             self.run_hints(pres, arguments)
+            caller, similar = local.caller, local.similar
+            called = time.perf_counter()
             ret = f(*args, **kwargs)
-            self.run_hints(posts, ret, arguments)
+            returned = time.perf_counter()
+            local.caller, local.similar = caller, similar  # Hooked calls f made, e.g. in a row function
+            self.teller.caller = caller
+            self.teller.cost = returned - called
+            arguments['_dovpanda']['elapsed'] = returned - called
+            ret = self.run_hints(posts, ret, arguments)
+            if profile is not None:
+                overhead = time.perf_counter() - started - (returned - called)
+                profile.record('hooked', name, overhead, frame=captured - started, binding=bound - captured)
             return ret
 
         return run
 
     def run_hints(self, hints, *args):
+        """Run `hints` on `args`. Return the result of the hooked call, as wrapped by post hints"""
+        result = args[0] if len(args) > 1 else None
         if self.resticted_dirs():
-            return
+            return result
+        skipped = []
+        local = self.local
         for hint in hints:
+            if local.similar > hint.stop_nudge:
+                continue
+            hint_args = self._fit_to_budget(hint, args)
+            if hint_args is None:
+                skipped.append(hint)
+                continue
+            if hint.background and self._submit(hint, hint_args, args):
+                continue
+            elapsed, value = self._run_hint(hint, hint_args, args)
+            local.spent += elapsed
+            if hint.wraps_result and value is not None:
+                result = value
+        if skipped:
+            names = ', '.join(f'<code>{hint.replacement.__name__}</code>' for hint in skipped)
+            self.tell(f'Skipped {names} to keep this call fast. '
+                      f'You can raise <code>dovpanda.config.HINT_TIME_BUDGET</code> or '
+                      f'<code>dovpanda.config.HINT_ROW_BUDGET</code> to run them', color='grey')
+        return result
+
+    def _run_hint(self, hint, hint_args, args):
+        """Run a single hint and return the time it took and what it returned"""
+        start = time.perf_counter()
+        value = None
+        teller = self.local.teller or self.teller
+        teller.hint = hint.replacement.__name__
+        try:
+            value = hint.replacement(*hint_args)
+        except Exception as e:
+            self.tell(config.html_bug.format(hint=hint, e=e), color='red')
+        finally:
+            teller.hint = None
+        elapsed = time.perf_counter() - start
+        if elapsed > config.HINT_TIME_LIMIT and hint_args is args:
+            self._limit_rows(hint, args)
+        if self.profile is not None:
+            self.profile.record('hint', hint.replacement.__name__, elapsed)
+        return elapsed, value
+
+    def _submit(self, hint, hint_args, args):
+        """Run `hint` on the background pool. Return False if there is no pool or it is full"""
+        if self.executor is None or not self.slots.acquire(blocking=False):
+            return False
+        teller = self.snapshot_teller()  # Tells from the pool keep pointing to this call
+
+        def run_in_background():
             try:
-                if self.similar <= hint.stop_nudge:
-                    hint.replacement(*args)
-            except Exception as e:
-                self.tell(config.html_bug.format(hint=hint, e=e), color='red')
+                with self.telling_from(teller):
+                    self._run_hint(hint, hint_args, args)
+            finally:
+                self.slots.release()
+
+        future = self.executor.submit(run_in_background)
+        self.pending.add(future)
+        future.add_done_callback(self.pending.discard)
+        return True
+
+    def set_background(self, enabled=True, workers=None):
+        """Run read only post hints on a pool of `workers` threads, so results return without waiting for them"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+        if enabled:
+            self.executor = futures.ThreadPoolExecutor(max_workers=workers or config.BACKGROUND_WORKERS)
+            self.slots = threading.BoundedSemaphore(config.BACKGROUND_QUEUE_SIZE)
+
+    def set_memory_size(self, size):
+        """Number of latest hooked calls, of each thread, among which repeated calls are told only once"""
+        config.MEMORY_SIZE = size
+        self.local.memory.resize(size)  # Other threads resize on their next call
+
+    def set_profiling(self, enabled=True):
+        """Record call counts and timings of hooked methods and hints. See `stats`"""
+        if not enabled:
+            self.profile = None
+        elif self.profile is None:
+            self.profile = Profile(config.PROFILE_SAMPLES)
+
+    def stats(self):
+        if self.profile is None:
+            return Profile(config.PROFILE_SAMPLES).to_frame()
+        return self.profile.to_frame()
+
+    def reset_stats(self):
+        if self.profile is not None:
+            self.profile = Profile(config.PROFILE_SAMPLES)
+
+    def wait(self, timeout=None):
+        """Wait for hints running in the background"""
+        futures.wait(list(self.pending), timeout=timeout)
+
+    def set_collecting(self, enabled=True, path=None):
+        """
+        Have processes started from now on write their hints as events to files under `path`, instead of telling
+        them. Returns the path. By default it is a new temporary directory, removed when collecting is turned off
+        or the process exits. See `collected` and `report`
+        """
+        if self.collect_tempdir is not None:
+            remove_dir(self.collect_tempdir, os.getpid())
+            self.collect_tempdir = None
+        if not enabled:
+            os.environ.pop(config.COLLECT_ENV, None)
+            self.collect_path = None
+            return None
+        if path is None:
+            path = self.collect_tempdir = tempfile.mkdtemp(prefix='dovpanda-')
+            atexit.register(remove_dir, path, os.getpid())  # In case collecting is never turned off
+        path = str(path)
+        os.makedirs(path, exist_ok=True)
+        os.environ[config.COLLECT_ENV] = f'{os.getpid()}:{path}'  # Inherited by workers, whatever starts them
+        self.collect_path = path
+        return path
+
+    def join_collector(self):
+        """In a worker of a collecting process, write hints as events for it instead of telling them"""
+        collector = os.environ.get(config.COLLECT_ENV)
+        if not collector:
+            return
+        pid, path = collector.split(':', 1)
+        if int(pid) != os.getpid():
+            self.collect_path = self.collect_tempdir = None
+            self.set_output(HintEvents(path))
+
+    def _after_fork(self):
+        self.executor = None  # The pool's threads don't survive a fork, background hints run in the call instead
+        self.pending = set()
+        self.join_collector()
+
+    def collected(self):
+        if self.collect_path is None:
+            return HintEvents.to_frame({})
+        return HintEvents.to_frame(HintEvents.read(self.collect_path))
+
+    def report(self):
+        """Tell a single summary of the hints collected from worker processes, and return them"""
+        collected = self.collected()
+        if collected.empty:
+            return collected
+        items = []
+        for row in collected.itertuples(index=False):
+            cost = f', {row.cost:.1f} seconds measured' if row.cost else ''
+            items.append(f'<li><code>{row.hint}</code> on line {row.lineno} of {os.path.basename(row.filename)}: '
+                         f'{row.count:,} times in {row.processes} processes{cost}<br>{row.message}</li>')
+        frame = sys._getframe(1)
+        while frame.f_back is not None and self.is_restricted(frame.f_code.co_filename):  # e.g. dovpanda.report()
+            frame = frame.f_back
+        self.teller.caller = Caller.from_frame(frame)
+        self.tell(f'Worker processes told {collected["count"].sum():,} hints, {len(collected)} distinct:'
+                  f'<ul>{"".join(items)}</ul>')
+        return collected
+
+    def _fit_to_budget(self, hint, args):
+        """
+        Arguments to run `hint` with, possibly on a sample of the result, or None if it can't fit the budget.
+        A sampled hint still finds the complete result in the details, for facts it must not estimate
+        """
+        if self.local.spent > config.HINT_TIME_BUDGET:
+            return None
+        if hint.hook_type != 'post':
+            return args
+        res, arguments = args
+        if not hasattr(res, 'iloc') or len(res) <= hint.row_limit():
+            return args
+        if hint.on_large != 'sample':
+            return None
+        details = dict(arguments['_dovpanda'], rows=len(res), sampled=True, result=res)
+        size = config.HINT_SAMPLE_ROWS  # All the sampled hints of a call get the same sample, and share its stats
+        sample = details['stats'].of(res).remember(('sample', size), lambda: sample_rows(res, size))
+        return sample, dict(arguments, _dovpanda=details)
+
+    @staticmethod
+    def _limit_rows(hint, args):
+        """Don't run `hint` in full again on results as large as the one it was too slow on"""
+        if hint.hook_type != 'post' or not hasattr(args[0], 'iloc'):
+            return
+        rows = len(args[0])
+        if rows > config.HINT_SAMPLE_ROWS:
+            hint.max_rows = min(hint.row_limit(), rows - 1)
 
-    def _get_arguments(self, f, *args, **kwargs):
-        sig = inspect.signature(f).bind(*args, **kwargs)
-        sig.apply_defaults()
-        sig.arguments['_dovpanda'] = {'source_func_name': f.__name__}
-        return sig.arguments
+    def get_binder(self, f, names=None, layout=None):
+        key = (f, names)
+        if key not in self.binders:
+            self.binders[key] = Binder(f, names, layout)
+        return self.binders[key]
 
     def _set_caller_details(self, f):
-        frame = inspect.currentframe().f_back.f_back
-        self.caller = inspect.getframeinfo(frame)
-        if self.resticted_dirs():
+        local = self.local
+        local.caller = Caller.from_frame(sys._getframe(2))
+        if self.is_restricted(local.caller.filename):
             return
         self._update_memory(f)
-        self.teller.caller = self.caller
+        self.teller.caller = local.caller
 
     def _update_memory(self, f):
-        self.memory.append((f, self.caller))
-        latest = self.memory[-1]
-        similar = [caller for caller in self.memory if caller == latest]
-        similar = len(similar)
-        self.similar = similar
+        local = self.local
+        caller = local.caller
+        if local.memory.maxlen != config.MEMORY_SIZE:  # Set since this thread's last call
+            local.memory.resize(config.MEMORY_SIZE)
+        local.similar = local.memory.append((f, caller.filename, caller.lineno))  # Hashing code objects is slow
 
     def resticted_dirs(self):
-        caller_file = self.caller.filename
-        if any([caller_file.startswith(str(dir_name)) for dir_name in config.RESTRICTED_DIRS]):
-            return True
-        return False
+        return self.is_restricted(self.local.caller.filename)
+
+    def is_restricted(self, filename):
+        try:
+            return self.restricted_files[filename]
+        except KeyError:
+            verdict = normalize_path(filename).startswith(self.restricted_prefixes)
+            self.restricted_files[filename] = verdict
+            return verdict
+
+    def add_restricted_dirs(self, *dir_names):
+        """Calls made from files under `dir_names` will not be hinted"""
+        prefixes = tuple(os.path.join(normalize_path(dir_name), '') for dir_name in dir_names)
+        self.restricted_prefixes += prefixes
+        for filename, verdict in self.restricted_files.items():
+            if not verdict:
+                self.restricted_files[filename] = normalize_path(filename).startswith(prefixes)
 
     # Output
 
     def tell(self, *args, **kwargs):
-        self.teller.tell(*args, **kwargs)
+        (self.local.teller or self.teller).tell(*args, **kwargs)
+
+    def snapshot_teller(self):
+        """Copy of the teller, to tell about the current call after it returned"""
+        return self.teller.snapshot()
+
+    @contextmanager
+    def telling_from(self, teller):
+        """Tell through `teller` in this thread, e.g. from the background or when a returned reader is consumed"""
+        previous = self.local.teller
+        self.local.teller = teller
+        try:
+            yield
+        finally:
+            self.local.teller = previous
 
     def set_output(self, output):
         self.teller.set_output(output)
@@ -230,6 +877,29 @@ class Ledger:
             self.set_output(current_output)
 
 
+LEDGERS = weakref.WeakSet()
+
+
+def after_fork():
+    for ledger in list(LEDGERS):
+        ledger._after_fork()
+
+
+if hasattr(os, 'register_at_fork'):  # Python >= 3.7
+    os.register_at_fork(after_in_child=after_fork)
+
+
+def remove_dir(path, pid):
+    """Remove a directory made by process `pid`, unless called in a process forked from it"""
+    if os.getpid() == pid:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def normalize_path(path):
+    """Absolute form of a path, to compare it with others. Relative paths are taken from the working directory"""
+    return os.path.normcase(os.path.abspath(str(path)))
+
+
 def rgetattr(obj, attr):
     attributes = attr.strip('.').split('.')
     for att in attributes:
@@ -256,6 +926,80 @@ def listify(val):
     return val
 
 
+def bound_names(hints):
+    """Argument names read by any of `hints`, or None if one of them reads all arguments"""
+    reads = [hint.reads for hint in hints]
+    if None in reads:
+        return None
+    return frozenset(chain.from_iterable(reads))
+
+
+FramesSummary = namedtuple('FramesSummary', ['count', 'rows', 'widths', 'column_names'])
+
+
+def summarize_frames(objs):
+    """
+    Number of frames (or series) in `objs`, and the sets of their row counts, column counts and column names,
+    in a single pass over all of them. Columns shared by several frames are only read once
+    """
+    if isinstance(objs, Mapping):
+        objs = objs.values()
+    if not isinstance(objs, Sequence):
+        objs = list(objs)
+    rows, widths, column_names, seen = set(), set(), set(), set()
+    for obj in objs:
+        if obj is None:  # Dropped by concat
+            continue
+        rows.add(len(obj))
+        columns = getattr(obj, 'columns', None)
+        if columns is None:  # A series is a single column named after it
+            widths.add(1)
+            column_names.add(obj.name)
+            continue
+        widths.add(len(columns))
+        if id(columns) not in seen:  # Frames sliced from one another share their columns
+            seen.add(id(columns))
+            column_names.update(columns.values)  # Iterating the array is much faster than the index
+    return FramesSummary(len(objs), rows, widths, column_names)
+
+
+def sample_rows(obj, size):
+    """
+    About `size` rows of `obj` in their order, one at a random position out of each stretch of rows,
+    so the sample follows the whole object without picking the same phase of periodic data
+    """
+    step = (len(obj) - 1) // size + 1
+    positions = np.arange(0, len(obj), step)
+    positions += np.random.RandomState(len(obj)).randint(0, step, len(positions))
+    return obj.iloc[np.minimum(positions, len(obj) - 1)]
+
+
+def nbytes(value):
+    """Rough memory footprint of a value, not counting the python objects a pandas object holds"""
+    if hasattr(value, 'memory_usage'):
+        usage = value.memory_usage(deep=False)
+        return int(getattr(usage, 'sum', lambda: usage)())
+    if hasattr(value, 'nbytes'):
+        return value.nbytes
+    return sys.getsizeof(value)
+
+
+def estimate_nunique(values, sample_size):
+    """
+    Estimate the number of unique values in a series from a random sample of `sample_size` rows,
+    with the bias corrected Chao1 estimator. As it mostly underestimates, a large estimate is reliable.
+    Short series are counted exactly
+    """
+    rows = len(values)
+    if rows <= 2 * sample_size:
+        return values.nunique()
+    positions = np.unique(np.random.RandomState(0).randint(0, rows, sample_size))
+    counts = values.iloc[positions].value_counts()
+    once = (counts == 1).sum()
+    twice = (counts == 2).sum()
+    return min(len(counts) + once * (once - 1) / (2 * (twice + 1)), rows)
+
+
 def setify(val):
     return set(listify(val))
 
@@ -265,7 +1009,8 @@ def is_assignment(caller):
         node = ast.parse(caller.code_context[0])
     except SyntaxError:
         return False
-
+    if not node.body:
+        return False
     return isinstance(node.body[0], ast.Assign)
 
 
@@ -1,4 +1,6 @@
 import inspect
+import json
+import os
 import pathlib
 
 import pandas
@@ -7,6 +9,8 @@ import pandas
 PANDAS_DIR = pathlib.Path(inspect.getsourcefile(pandas)).parent.absolute()
 CURDIR = pathlib.Path(inspect.getsourcefile(inspect.currentframe())).parent.absolute()
 RESTRICTED_DIRS = [PANDAS_DIR, CURDIR]
+CACHE_DIR = pathlib.Path(os.environ.get('DOVPANDA_CACHE_DIR') or
+                         pathlib.Path(os.environ.get('XDG_CACHE_HOME') or pathlib.Path.home() / '.cache') / 'dovpanda')
 
 
 def is_callable(obj):
@@ -17,7 +21,7 @@ def get_callables(obj):
     return inspect.getmembers(obj, predicate=is_callable)
 
 
-def methods_by_argument(arg_name):
+def find_methods_by_argument(arg_name):
     ret = []
     for obj in [pandas.DataFrame, pandas.Series]:
         for name, func in inspect.getmembers(obj, is_callable):
@@ -29,18 +33,75 @@ def methods_by_argument(arg_name):
     return ret
 
 
+def registry_path():
+    from dovpanda import __version__
+    return CACHE_DIR / f'registry-pandas-{pandas.__version__}-dovpanda-{__version__}.json'
+
+
+REGISTRY_KEYS = {'PD_ALL', 'DF_ALL', 'SERIES_ALL', 'methods_by_argument', 'layouts', 'missing'}
+
+
+def load_registry():
+    """
+    Load the pandas reflection results cached for the installed pandas and dovpanda versions, or compute them.
+    The registry holds the pandas method lists, the parameter layout of each hooked method
+    and the hooked names missing from this pandas version. A file missing any of them is computed again
+    """
+    try:
+        with registry_path().open('r') as f:
+            registry = json.load(f)
+        if isinstance(registry, dict) and REGISTRY_KEYS.issubset(registry):
+            return registry
+    except (OSError, ValueError):
+        pass
+    registry = {
+        'PD_ALL': [f[0] for f in get_callables(pandas)],
+        'DF_ALL': ['DataFrame.' + f[0] for f in get_callables(pandas.DataFrame)],
+        'SERIES_ALL': ['Series.' + f[0] for f in get_callables(pandas.Series)],
+        'methods_by_argument': {},
+        'layouts': {},
+        'missing': [],
+    }
+    save_registry(registry)
+    return registry
+
+
+def save_registry(registry):
+    path = registry_path()
+    tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with tmp_path.open('w') as f:
+            json.dump(registry, f)
+        os.replace(str(tmp_path), str(path))
+    except OSError:  # A read only cache only costs the reflection on the next start
+        pass
+
+
+def methods_by_argument(arg_name):
+    by_argument = REGISTRY['methods_by_argument']
+    if arg_name not in by_argument:
+        by_argument[arg_name] = find_methods_by_argument(arg_name)
+        save_registry(REGISTRY)
+    return by_argument[arg_name]
+
+
 # pandas mathods
-PD_ALL = [f[0] for f in get_callables(pandas)]
-DF_ALL = ['DataFrame.' + f[0] for f in get_callables(pandas.DataFrame)]
-SERIES_ALL = ['Series.' + f[0] for f in get_callables(pandas.Series)]
+REGISTRY = load_registry()
+PD_ALL = REGISTRY['PD_ALL']
+DF_ALL = REGISTRY['DF_ALL']
+SERIES_ALL = REGISTRY['SERIES_ALL']
 
 READ_METHODS = [method for method in PD_ALL if 'read' in method]
+TEXT_READ_METHODS = ['read_csv', 'read_table', 'read_fwf']
+READ_PATH_ARGUMENTS = ['filepath_or_buffer', 'path', 'path_or_buf', 'io']  # Names of the file argument of reads
 WRITE_TEXT_METHODS = ['DataFrame.to_csv', 'DataFrame.to_json', 'Series.to_csv', 'Series.to_json']
 DF_CREATION = READ_METHODS
 SERIES_CREATION = READ_METHODS + ['Series.__init__']
-GET_ITEM = ['DataFrame.__getitem__', 'Series.__getitem__',
-            'core.indexing._NDFrameIndexer.__getitem__', 'core.indexing._LocationIndexer.__getitem__']
+GET_ITEM = ['core.indexing._NDFrameIndexer.__getitem__', 'core.indexing._LocationIndexer.__getitem__']  # loc, iloc
 MERGE_DFS = ['merge', 'merge_ordered', 'merge_asof', 'concat', 'DataFrame.append', 'DataFrame.join']
+GROUPBY_AGGREGATIONS = [f'core.groupby.generic.{kind}GroupBy.{method}' for kind in ['DataFrame', 'Series']
+                        for method in ['agg', 'aggregate', 'apply', 'transform']]
 
 # lists
 TIME_COLUMNS = ['year', 'month', 'week', 'day', 'hour', 'minute', 'second', 'weekday', 'time']
@@ -52,8 +113,68 @@ color_to_level = {'blue': 'info', 'red': 'danger', 'green': 'success', 'yellow':
                   'brightblue': 'primary', 'grey': 'secondary', 'white': 'light', 'black': 'dark'}
 #
 CATEGORY_SHARE_THRESHOLD = 4
+CARDINALITY_SAMPLE_SIZE = 10000  # Rows sampled to estimate the unique values of a column
+CARDINALITY_MARGIN = 2  # Columns estimated above this many times the threshold are not counted exactly
+CHUNK_UNIQUES_LIMIT = 10000  # Unique values tracked per column over a chunked read, more is not a category
+
+# Memory footprint
+MEMORY_ADVICE_BYTES = 100000000  # Frames taking less memory than this, in bytes, are not worth shrinking, 100 MB
+MEMORY_SAVING_SHARE = 0.3  # Share of a frame's memory smaller dtypes must save to be suggested
+STRING_SAMPLE_SIZE = 1000  # Values sampled per text column to estimate its size in memory
 
 MAX_CSV_SIZE = 100000000  # Size in bytes, 100 MB
+MAX_READ_MEMORY = 1000000000  # Estimated size in memory of a read frame, in bytes, 1 GB
+
+# Read preflight
+PREFLIGHT_PEEK_BYTES = 65536  # Bytes of a file parsed to estimate reading all of it
+PREFLIGHT_MANY_COLUMNS = 20
+# Read arguments not passed on to the parse of the first bytes, as they limit its rows or expect the complete file
+PREFLIGHT_SKIPPED_ARGUMENTS = ['nrows', 'chunksize', 'iterator', 'skipfooter', 'memory_map', 'compression']
+COMPRESSED_EXTENSIONS = ('.gz', '.bz2', '.zip', '.xz', '.zst')
+
+# Row loops
+LOOP_MIN_ROWS = 1000  # Loops over fewer rows are not timed
+LOOP_TIME_THRESHOLD = 1.0  # Seconds a row loop is projected to take before it is worth vectorizing
+
+# Concat
+ITERABLE_ARGUMENTS = ['objs']  # Arguments that may be one-shot iterators, handed on as lists once hints read them
+
+# Frames grown in a loop
+GROWTH_MIN_CALLS = 8  # Calls growing the same frame from a single line before it is a loop worth telling about
+GROWTH_MIN_BYTES = 10000000  # Bytes those calls must have copied, 10 MB
+
+# Merge
+MERGE_SAMPLE_SIZE = 10000  # Rows sampled from each side of a merge to count its key values
+MERGE_EXPLOSION_FACTOR = 10  # Times the larger side a merge result may grow before it is told
+MERGE_EXPLOSION_ROWS = 1000000  # Results smaller than this many rows are not told
+
+# Groupby
+GROUPBY_MIN_ROWS = 100000  # Frames with fewer rows are grouped fast enough by any key
+GROUPBY_TIME_THRESHOLD = 0.5  # Seconds an aggregation takes before its faster forms are measured and told
+GROUPBY_TIMING_ROWS = 100000  # Rows of a key hashed to measure how long grouping by it takes
+
+# Hint budget
+HINT_TIME_BUDGET = 1.0  # Seconds all hints of a single call may take, the rest are skipped
+HINT_TIME_LIMIT = 0.5  # Seconds a single post hint may take before results that large are sampled or skipped
+HINT_ROW_BUDGET = 5000000  # Rows a scanning post hint analyses in full, larger results are sampled or skipped
+HINT_SAMPLE_ROWS = 100000  # Rows a post hint sees when it runs on a sample
+
+PROFILE_SAMPLES = 1000  # Latest durations kept per hooked method or hint for percentiles
+
+# Background hints
+BACKGROUND_WORKERS = 2
+BACKGROUND_QUEUE_SIZE = 16  # Hints waiting for the pool, more run on the caller's thread
+
+# Worker processes
+COLLECT_ENV = 'DOVPANDA_COLLECT'  # Tells worker processes the pid and directory of the process collecting their hints
+
+LAZY_HOOKS = True  # Inspect a hooked method's signature on its first call instead of when dovpanda starts
+
+MEMORY_SIZE = 32  # Number of latest hooked calls remembered to detect repeated calls
+
+# Datetime detection
+DATETIME_SAMPLE_SIZE = 1000  # Values checked per column, no matter how long the column is
+DATETIME_CONFIDENCE = 0.95  # Share of sampled values that must parse for a column to look like a datetime
 
 try:
     with (CURDIR / 'resource' / 'logo').open('r') as f:
@@ -1,6 +1,21 @@
+import ast
+import builtins
+import functools
+import importlib.util
+import inspect
+import io
 import os
+import re
+import sys
+import textwrap
+import time
+import types
+import weakref
+from collections import OrderedDict
+from collections.abc import Mapping
 
 import numpy as np
+import pandas as pd
 from dateutil import parser
 
 from dovpanda import base, config
@@ -9,15 +24,158 @@ from dovpanda.base import Ledger
 ledger = Ledger()
 
 
-@ledger.add_hint(['DataFrame.iterrows', 'DataFrame.apply', 'DataFrame.itertuples'])
-def avoid_df_loop(arguments):
+def stats_of(obj, arguments):
+    """Stats of `obj` shared by all hints of the current call"""
+    return arguments.get('_dovpanda').get('stats').of(obj)
+
+
+@ledger.add_hint(['DataFrame.iterrows', 'DataFrame.itertuples'], 'post', reads=['self'], wraps_result=True)
+def time_row_loop(res, arguments):
+    rows = len(arguments.get('self'))
+    if rows < config.LOOP_MIN_ROWS:
+        return None
     func = arguments.get('_dovpanda').get('source_func_name')
-    ledger.tell(f"df.{func} is not recommended. Essentially it is very similar to "
-                f"iterating the rows of the frames in a loop. In the majority of "
-                f"cases, there are better alternatives that utilize pandas' vector operation")
+    return timed_rows(res, rows, func, ledger.snapshot_teller())
+
+
+def timed_rows(iterator, rows, func, teller):
+    """
+    Yield the rows of `iterator`, and tell once if the loop over them is projected to take longer than
+    `config.LOOP_TIME_THRESHOLD`. The pace is checked after 64, 128, 256... rows, so the check costs next to nothing
+    """
+    started = time.perf_counter()
+    checkpoint = 64
+    for done, row in enumerate(iterator, 1):
+        yield row
+        if done < checkpoint:
+            continue
+        checkpoint *= 2
+        elapsed = time.perf_counter() - started
+        if elapsed * rows / done > config.LOOP_TIME_THRESHOLD:
+            with ledger.telling_from(teller):
+                ledger.tell(loop_message(func, rows, elapsed, done))
+            yield from iterator
+            return
+
+
+@ledger.add_hint('DataFrame.apply', 'post', reads=['self', 'func', 'axis'])
+def time_row_apply(res, arguments):
+    if arguments.get('axis') not in (1, 'columns'):
+        return
+    elapsed = arguments.get('_dovpanda').get('elapsed')
+    rows = len(arguments.get('self'))
+    if rows < config.LOOP_MIN_ROWS or elapsed < config.LOOP_TIME_THRESHOLD:
+        return
+    ledger.tell(loop_message('apply', rows, elapsed, rows, vectorized(arguments.get('func'))))
+
+
+def loop_message(func, rows, elapsed, done, alternative=None):
+    rate = done / elapsed
+    if done < rows:
+        message = (f'This loop over <code>df.{func}()</code> runs about {rate:,.0f} rows per second, '
+                   f'so its {rows:,} rows will take about {human_seconds(rows / rate)}. ')
+    else:
+        message = (f'<code>df.{func}(axis=1)</code> took {human_seconds(elapsed)} for {rows:,} rows, '
+                   f'about {rate:,.0f} rows per second. ')
+    message += "Operations on whole columns utilize pandas' vector operations and are usually far faster"
+    if alternative:
+        message += f', try: <code>{alternative}</code>'
+    elif func == 'iterrows':
+        message += '. If you must loop, <code>df.itertuples()</code> is much faster than <code>df.iterrows()</code>'
+    return message
 
 
-@ledger.add_hint('DataFrame.groupby')
+def human_seconds(seconds):
+    if seconds < 1:
+        return f'{seconds * 1000:.0f} milliseconds'
+    if seconds < 120:
+        return f'{seconds:.1f} seconds'
+    if seconds < 7200:
+        return f'{seconds / 60:.0f} minutes'
+    return f'{seconds / 3600:.1f} hours'
+
+
+VECTOR_OPERATORS = {ast.Add: '+', ast.Sub: '-', ast.Mult: '*', ast.Div: '/', ast.FloorDiv: '//', ast.Mod: '%',
+                    ast.Pow: '**'}
+PRECEDENCE = {ast.Add: 1, ast.Sub: 1, ast.Mult: 2, ast.Div: 2, ast.FloorDiv: 2, ast.Mod: 2, ast.Pow: 3}
+
+
+def vectorized(func):
+    """
+    Column expression that does what a row function does, for functions that only do arithmetic on fields of
+    the row, e.g. <code>df['a'] + df['b']</code> for <code>lambda row: row['a'] + row['b']</code>. None otherwise
+    """
+    parsed = single_expression(func)
+    if parsed is None:
+        return None
+    try:
+        return column_expression(parsed[1], parsed[0])
+    except ValueError:
+        return None
+
+
+def single_expression(func):
+    """Name of the single argument of a lambda or a one line function, and the expression it returns. None otherwise"""
+    try:
+        tree = ast.parse(textwrap.dedent(inspect.getsource(func)).strip())
+    except (OSError, TypeError, SyntaxError):  # No source, or a lambda in the middle of a statement
+        return None
+    if getattr(func, '__name__', None) == '<lambda>':
+        bodies = [node for node in ast.walk(tree) if isinstance(node, ast.Lambda) and node.lineno == 1]
+        if len(bodies) != 1:  # Can't tell which lambda on the line is the one
+            return None
+        args, body = bodies[0].args.args, bodies[0].body
+    else:
+        definition = tree.body[0]
+        if not isinstance(definition, ast.FunctionDef) or len(definition.body) != 1:
+            return None
+        if not isinstance(definition.body[0], ast.Return) or definition.body[0].value is None:
+            return None
+        args, body = definition.args.args, definition.body[0].value
+    if len(args) != 1:
+        return None
+    return args[0].arg, body
+
+
+def column_expression(node, row):
+    """Source of `node` with fields of `row` read from the columns of df. Raises ValueError on anything else"""
+    if isinstance(node, ast.BinOp) and type(node.op) in VECTOR_OPERATORS:
+        left, right = column_expression(node.left, row), column_expression(node.right, row)
+        precedence = PRECEDENCE[type(node.op)]
+        right_binds = isinstance(node.op, ast.Pow)  # ** groups from the right, the rest from the left
+        if isinstance(node.left, ast.BinOp) and PRECEDENCE[type(node.left.op)] < precedence + right_binds:
+            left = f'({left})'
+        elif isinstance(node.left, ast.UnaryOp) and right_binds:
+            left = f'({left})'
+        if isinstance(node.right, ast.BinOp) and PRECEDENCE[type(node.right.op)] < precedence + (not right_binds):
+            right = f'({right})'
+        return f'{left} {VECTOR_OPERATORS[type(node.op)]} {right}'
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        operand = column_expression(node.operand, row)
+        return f'-({operand})' if isinstance(node.operand, ast.BinOp) else f'-{operand}'
+    if isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name) and node.value.id == row:
+        key = node.slice.value if isinstance(node.slice, getattr(ast, 'Index', ())) else node.slice  # < 3.9
+        return f'df[{literal(key)!r}]'
+    if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) and node.value.id == row:
+        return f'df[{node.attr!r}]'
+    if (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and not node.keywords
+            and isinstance(node.func.value, ast.Name) and node.func.value.id in ('np', 'numpy')):
+        args = ', '.join(column_expression(arg, row) for arg in node.args)
+        return f'{node.func.value.id}.{node.func.attr}({args})'
+    value = literal(node)
+    if isinstance(value, (int, float)):
+        return repr(value)
+    raise ValueError(f'{type(node).__name__} has no column expression')
+
+
+def literal(node):
+    try:
+        return ast.literal_eval(node)
+    except ValueError:
+        raise ValueError(f'{type(node).__name__} is not a literal')
+
+
+@ledger.add_hint('DataFrame.groupby', reads='by')
 def time_grouping(arguments):
     by = base.setify(arguments.get('by'))
     time_cols = set(config.TIME_COLUMNS).intersection(by)
@@ -36,34 +194,192 @@ def time_grouping(arguments):
                 f"<code>df.set_index('date').resample('h')</code>")
 
 
-@ledger.add_hint(config.MERGE_DFS, hook_type='post')
+@ledger.add_hint('DataFrame.groupby', reads=['self', 'by', 'observed'])
+def groupby_keys(arguments):
+    df = arguments.get('self')
+    stats = stats_of(df, arguments)
+    if not stats.columns_are_unique:
+        return
+    keys = group_labels(df, arguments.get('by'))
+    categorical = [key for key in keys if is_categorical(df[key].dtype)]
+    observed = arguments.get('observed')
+    if categorical and (observed is NO_DEFAULT or not observed):
+        groups = int(np.prod([len(df[key].cat.categories) for key in categorical]))
+        present = min(len(df), int(np.prod([stats.nunique(key) for key in categorical])))
+        if groups > present:
+            names = ', '.join(f'<code>{key}</code>' for key in categorical)
+            combination = ' combination' if len(categorical) > 1 else ''
+            ledger.tell(f'Grouping by categorical {names} without <code>observed=True</code> makes a group for every '
+                        f'category{combination}: {groups:,} groups, though at most {present:,} of them have rows. '
+                        f'Group with <code>observed=True</code> to only get the groups that have rows')
+    if len(df) < config.GROUPBY_MIN_ROWS:
+        return
+    for key in keys:
+        if df[key].dtype == object and stats.nunique_estimate(key) <= len(df) / 2:
+            hashing = hashing_time(df[key])
+            ledger.tell(f'Grouping by text column <code>{key}</code> hashes all of its {len(df):,} strings on every '
+                        f'groupby, which takes about {human_seconds(hashing)} here. A category is grouped by its '
+                        f'codes without hashing, so if you group by it more than once, convert it once and group '
+                        f"with <code>observed=True</code>: <code>df['{key}'] = df['{key}'].astype('category')</code>")
+
+
+NO_DEFAULT = getattr(pd.api.extensions, 'no_default', object())  # Default of observed in pandas >= 2.1, still False
+
+
+def hashing_time(column):
+    """Seconds hashing all the values of a column takes, measured on a sample of it"""
+    step = (len(column) - 1) // config.GROUPBY_TIMING_ROWS + 1
+    sample = column.to_numpy()[::step]
+    started = time.perf_counter()
+    pd.factorize(sample)
+    return (time.perf_counter() - started) * len(column) / len(sample)
+
+
+def group_labels(df, by):
+    """Column labels among the keys of a groupby"""
+    labels = []
+    for key in by if isinstance(by, list) else [by]:
+        try:
+            if key in df.columns:
+                labels.append(key)
+        except TypeError:  # An array, a series or a function
+            pass
+    return labels
+
+
+@ledger.add_hint(config.GROUPBY_AGGREGATIONS, 'post', reads=['self', 'func', 'arg', 'func_or_funcs'])
+def time_group_aggregation(res, arguments):
+    details = arguments.get('_dovpanda')
+    elapsed = details.get('elapsed')
+    if elapsed < config.GROUPBY_TIME_THRESHOLD:
+        return
+    grouped = arguments.get('self')
+    method = details.get('source_func_name')
+    func = next((arguments.get(name) for name in ['func', 'arg', 'func_or_funcs']
+                 if arguments.get(name) is not None), None)
+    tips = []
+    if python_functions(func):
+        named = named_aggregations(func)
+        if named is None:
+            tips.append("It calls a Python function for every group. Built-in aggregations such as <code>'sum'</code>"
+                        " or <code>'mean'</code>, or vectorized column operations before grouping, are far faster")
+        else:
+            faster = time_named_aggregations(grouped, named)
+            if isinstance(named, str):
+                code = f'.transform({named!r})' if method == 'transform' else f'.{named}()'
+            else:
+                code = f'.agg({named!r})'
+            tips.append(f'Use the built-in aggregation instead of a Python function: <code>{code}</code>. '
+                        f'It took {human_seconds(faster)} on this data')
+    if getattr(grouped, 'sort', False):
+        tips.append("If you don't need the groups sorted, group with <code>sort=False</code>")
+    if not tips:
+        return
+    tips = ''.join(f'<li>{tip}</li>' for tip in tips)
+    ledger.tell(f'<code>.{method}()</code> took {human_seconds(elapsed)} over {grouped.ngroups:,} groups.'
+                f'<ul>{tips}</ul>')
+
+
+GROUP_AGGREGATIONS = {'sum', 'mean', 'median', 'min', 'max', 'std', 'var', 'sem', 'prod', 'count', 'nunique'}
+BUILTIN_AGGREGATIONS = {'sum': 'sum', 'len': 'size', 'min': 'min', 'max': 'max'}
+# np.std and np.var use another ddof than pandas, so they have no built-in counterpart
+NUMPY_AGGREGATIONS = {'sum': 'sum', 'nansum': 'sum', 'mean': 'mean', 'nanmean': 'mean', 'median': 'median',
+                      'min': 'min', 'amin': 'min', 'max': 'max', 'amax': 'max', 'prod': 'prod'}
+
+
+def python_functions(func):
+    """Python functions among the aggregations of a groupby, e.g. lambdas"""
+    if isinstance(func, dict):
+        return [f for value in func.values() for f in python_functions(value)]
+    if isinstance(func, (list, tuple)):
+        return [f for value in func for f in python_functions(value)]
+    if not isinstance(func, types.FunctionType) or func is getattr(np, func.__name__, None):
+        return []
+    return [func]
+
+
+def named_aggregations(func):
+    """`func` with its Python functions replaced by the names of the built-in aggregations they do, or None"""
+    if isinstance(func, dict):
+        named = {col: named_aggregations(value) for col, value in func.items()}
+        return None if None in named.values() else named
+    if isinstance(func, (list, tuple)):
+        named = [named_aggregations(value) for value in func]
+        return None if None in named else named
+    if isinstance(func, str):
+        return func
+    name = str(getattr(func, '__name__', None))
+    if func is getattr(np, name, None):  # e.g. np.sum, which pandas runs as 'sum'
+        return NUMPY_AGGREGATIONS.get(name)
+    if func is getattr(builtins, name, None):
+        return BUILTIN_AGGREGATIONS.get(name)
+    return named_aggregation(func) if isinstance(func, types.FunctionType) else None
+
+
+def named_aggregation(func):
+    """Name of the built-in aggregation a function does, e.g. 'sum' for <code>lambda x: x.sum()</code>, or None"""
+    parsed = single_expression(func)
+    if parsed is None:
+        return None
+    arg, body = parsed
+    if not isinstance(body, ast.Call) or body.keywords:
+        return None
+    target = body.func
+    if isinstance(target, ast.Attribute) and isinstance(target.value, ast.Name) and target.value.id == arg:
+        return target.attr if target.attr in GROUP_AGGREGATIONS and not body.args else None
+    if len(body.args) != 1 or not isinstance(body.args[0], ast.Name) or body.args[0].id != arg:
+        return None
+    if isinstance(target, ast.Name):
+        return BUILTIN_AGGREGATIONS.get(target.id)
+    if isinstance(target, ast.Attribute) and isinstance(target.value, ast.Name) and target.value.id in ('np', 'numpy'):
+        return NUMPY_AGGREGATIONS.get(target.attr)
+    return None
+
+
+def time_named_aggregations(grouped, named):
+    """Seconds the built-in aggregations take on `grouped`"""
+    started = time.perf_counter()
+    if isinstance(named, dict):
+        for col, names in named.items():
+            for name in base.listify(names):
+                getattr(grouped[col], name)()
+    else:
+        for name in base.listify(named):
+            getattr(grouped, name)()
+    return time.perf_counter() - started
+
+
+@ledger.add_hint(config.MERGE_DFS, hook_type='post', reads=[], on_large='skip', background=True)
 def duplicate_index_after_concat(res, arguments):
-    if res.index.nunique() != len(res.index):
+    stats = stats_of(res, arguments)
+    if not stats.index_is_unique:
         ledger.tell('After concatenation you have duplicated indices - pay attention')
-    if res.columns.nunique() != len(res.columns):
+    if not stats.columns_are_unique:
         ledger.tell('After concatenation you have duplicated column names - pay attention')
 
 
-@ledger.add_hint('concat')
+@ledger.add_hint('concat', reads=['objs', 'axis'])
 def concat_single_column(arguments):
     objs = arguments.get('objs')
-    axis = arguments.get('axis')
-    cols = {df.shape[1] for df in objs}
-    if axis == 1 and 1 in cols:
+    axis = AXIS_NUMBERS.get(arguments.get('axis'))
+    if axis == 1 and 1 in stats_of(objs, arguments).frames.widths:
         ledger.tell(
             'One of the dataframes you are concatenating is with a single column, '
             'consider using `df.assign()` or `df.insert()`')
 
 
-@ledger.add_hint('concat')
+AXIS_NUMBERS = {0: 0, 'index': 0, 'rows': 0, 1: 1, 'columns': 1}
+
+
+@ledger.add_hint('concat', reads=['objs', 'axis'])
 def wrong_concat_axis(arguments):
     objs = arguments.get('objs')
-    axis = arguments.get('axis')
-    rows = {df.shape[0] for df in objs}
-    cols = {df.shape[1] for df in objs}
-    col_names = set.union(*[set(df.columns) for df in objs])
-    same_cols = (len(cols) == 1) and (len(col_names) == list(cols)[0])
-    same_rows = (len(rows) == 1)
+    axis = AXIS_NUMBERS.get(arguments.get('axis'))
+    frames = stats_of(objs, arguments).frames
+    if axis is None:
+        return
+    same_cols = (len(frames.widths) == 1) and (len(frames.column_names) == list(frames.widths)[0])
+    same_rows = (len(frames.rows) == 1)
     axis_translation = {0: 'vertically', 1: 'horizontally'}
     if same_cols and not same_rows:
         if axis == 1:
@@ -79,45 +395,260 @@ def wrong_concat_axis(arguments):
                     f"Pay attention, your axis is {axis} which concatenates {axis_translation[axis]}")
 
 
-@ledger.add_hint('DataFrame.__eq__')
+@ledger.add_hint('DataFrame.__eq__', reads=['self', 'other'])
 def df_check_equality(arguments):
     if isinstance(arguments.get('self'), type(arguments.get('other'))):
         ledger.tell(f'Calling df1 == df2 compares the objects element-wise. '
                     'If you need a boolean condition, try df1.equals(df2)')
 
 
-@ledger.add_hint('Series.__eq__')
+@ledger.add_hint('Series.__eq__', reads=['self', 'other'])
 def series_check_equality(arguments):
     if isinstance(arguments.get('self'), type(arguments.get('other'))):
         ledger.tell(f'Calling series1 == series2 compares the objects element-wise. '
                     'If you need a boolean condition, try series1.equals(series2)')
 
 
-@ledger.add_hint('read_csv', 'post')
+@ledger.add_hint('read_csv', 'post', reads=['filepath_or_buffer', 'index_col'], background=True)
 def csv_index(res, arguments):
+    if not hasattr(res, 'columns'):  # e.g. a reader of chunks
+        return
+    message = csv_index_message(res.columns, arguments)
+    if message:
+        ledger.tell(message)
+
+
+def csv_index_message(columns, arguments):
     filename = arguments.get('filepath_or_buffer')
     if type(filename) is str:
         filename = "'" + filename + "'"
     else:
         filename = 'file'
-    if 'Unnamed: 0' in res.columns:
+    if 'Unnamed: 0' in columns:
         if arguments.get('index_col') is None:
-            ledger.tell('Your left most column is unnamed. This suggets it might be the index column, try: '
-                        f'<code>pd.read_csv({filename}, index_col=0)</code>')
+            return ('Your left most column is unnamed. This suggets it might be the index column, try: '
+                    f'<code>pd.read_csv({filename}, index_col=0)</code>')
 
 
-@ledger.add_hint('read_csv', 'pre')
-def check_csv_size(arguments):
-    filename = arguments.get('filepath_or_buffer')
-    if not os.path.exists(filename):
+@ledger.add_hint(['read_csv', 'read_table', 'read_fwf'], 'post', reads=['filepath_or_buffer', 'index_col'])
+def analyse_chunks(res, arguments):
+    if not hasattr(res, 'get_chunk'):  # Not read with chunksize or iterator
         return
-    if os.path.getsize(filename) > config.MAX_CSV_SIZE:
-        ledger.tell('File size is very large and may take time to load. '
-                    'If you would like to avoid format issues before the complete file loads, '
-                    f'try:  <code>pd.read_csv({filename}, nrows=5)</code> to check schema is as expected.')
+    watch_chunks(res, ChunkAnalysis(arguments, ledger.snapshot_teller()))
+
+
+class ChunkAnalysis:
+    """
+    Read hints accumulated over the chunks of a chunked read, and told together when the reader is exhausted or
+    closed. The state is bounded: at most `config.CHUNK_UNIQUES_LIMIT` unique values per column
+    """
+
+    def __init__(self, arguments, teller):
+        self.arguments = arguments
+        self.teller = teller
+        self.rows = 0
+        self.chunks = 0
+        self.columns = None
+        self.uniques = {}  # Column to its unique values, or None when it can't be a category
+        self.date_dtypes = None  # Columns that looked like datetimes in every chunk, to their dtype
+        self.done = False
+
+    def add(self, chunk):
+        if not hasattr(chunk, 'columns'):
+            return
+        if self.columns is None:
+            self.columns = chunk.columns
+        self.rows += len(chunk)
+        self.chunks += 1
+        objects = chunk.select_dtypes('object').columns
+        for col in chunk.columns:
+            seen = self.uniques.setdefault(col, set()) if col in objects else None
+            if seen is not None:
+                seen.update(chunk[col].dropna().unique())
+                if len(seen) > config.CHUNK_UNIQUES_LIMIT:
+                    seen = None
+            self.uniques[col] = seen
+        date_dtypes = {}
+        for col in objects:
+            value_array = np.asarray(chunk[col])
+            if is_date_time_format(value_array):
+                date_dtypes[col] = value_array.dtype
+        if self.date_dtypes is not None:
+            date_dtypes = {col: dtype for col, dtype in date_dtypes.items() if col in self.date_dtypes}
+        self.date_dtypes = date_dtypes
+
+    def finish(self):
+        if self.done or not self.chunks:
+            return
+        self.done = True
+        messages = [csv_index_message(self.columns, self.arguments)]
+        threshold = int(self.rows / config.CATEGORY_SHARE_THRESHOLD) + 1
+        for col, seen in self.uniques.items():
+            if seen is not None and 0 < len(seen) <= threshold:
+                values = pd.Series(sorted(seen, key=str), dtype=object)
+                messages.append(category_message(col, len(seen), self.rows, values))
+        for col, dtype in self.date_dtypes.items():
+            messages.append(time_dtype_message(col, dtype))
+        messages = [message for message in messages if message]
+        if not messages:
+            return
+        with ledger.telling_from(self.teller):
+            ledger.tell(f'Read {self.rows} rows in {self.chunks} chunks.<br>' + '<br>'.join(messages))
+
+
+def watch_chunks(reader, analysis):
+    """Feed every chunk `reader` returns to `analysis`, without keeping the chunks"""
+    read, close = reader.read, reader.close
+
+    @functools.wraps(read)
+    def read_and_analyse(*args, **kwargs):
+        try:
+            chunk = read(*args, **kwargs)
+        except StopIteration:
+            finish_analysis(analysis)
+            raise
+        try:
+            analysis.add(chunk)
+        except Exception as e:
+            with ledger.telling_from(analysis.teller):
+                ledger.tell(config.html_bug.format(hint='analyse_chunks', e=e), color='red')
+            analysis.done = True
+        return chunk
+
+    @functools.wraps(close)
+    def close_and_tell():
+        finish_analysis(analysis)
+        close()
+
+    reader.read = read_and_analyse
+    reader.close = close_and_tell
+
+
+def finish_analysis(analysis):
+    try:
+        analysis.finish()
+    except Exception as e:
+        with ledger.telling_from(analysis.teller):
+            ledger.tell(config.html_bug.format(hint='analyse_chunks', e=e), color='red')
+
+
+@ledger.add_hint(config.READ_METHODS, 'pre',
+                 reads=config.READ_PATH_ARGUMENTS + ['sep', 'usecols', 'dtype', 'chunksize', 'iterator', 'nrows',
+                                                     'engine', 'compression'])
+def preflight_read(arguments):
+    if arguments.get('nrows') is not None:
+        return
+    source = next((arguments[arg] for arg in config.READ_PATH_ARGUMENTS if arguments.get(arg) is not None), None)
+    size = source_size(source)
+    if size is None or size <= config.MAX_CSV_SIZE:
+        return
+    func = arguments.get('_dovpanda').get('source_func_name')
+    rows, memory, columns, categories = estimate_read(func, source, size, arguments)
+    name = f"'{source}'" if isinstance(source, (str, os.PathLike)) else 'file'
+    estimate = f'File is {human_bytes(size)}'
+    if rows is not None:
+        estimate += f', about {rows:,} rows and {len(columns)} columns taking about {human_bytes(memory)} in memory'
+    tips = []
+    if 'nrows' in arguments:  # Bound only for the methods that have it
+        tips.append(f'Check the schema is as expected before the complete file loads: '
+                    f'<code>pd.{func}({name}, nrows=5)</code>')
+    if columns is not None and len(columns) > config.PREFLIGHT_MANY_COLUMNS and arguments.get('usecols') is None:
+        tips.append(f'If you only need some of the columns, read only them: '
+                    f'<code>usecols={list(columns[:3])}</code>')
+    if categories and arguments.get('dtype') is None:
+        dtype = {col: 'category' for col in categories}
+        tips.append(f'Read repetitive text columns as categories: <code>dtype={dtype}</code>')
+    if func in config.TEXT_READ_METHODS and arguments.get('engine') in (None, 'c') and has_pyarrow_engine():
+        tips.append("Parse with multiple threads: <code>engine='pyarrow'</code>")
+    if func in config.TEXT_READ_METHODS + ['read_excel']:
+        tips.append(f'If you read this file more than once, convert it once with <code>df.to_parquet()</code> '
+                    f'and read it with <code>pd.read_parquet()</code>')
+    if (memory is not None and memory > config.MAX_READ_MEMORY and 'chunksize' in arguments
+            and not arguments.get('chunksize') and not arguments.get('iterator')):
+        tips.append(f'Process it in parts: <code>for chunk in pd.{func}({name}, chunksize=100000)</code>')
+    tips = ''.join(f'<li>{tip}</li>' for tip in tips)
+    ledger.tell(f'{estimate}, so it may take time to load. To read it faster:<ul>{tips}</ul>')
+
+
+def source_size(source):
+    """Size in bytes of a path or an open file, or None if it is not a local file"""
+    try:
+        if isinstance(source, (str, os.PathLike)):
+            return os.stat(source).st_size if os.path.isfile(source) else None
+        if hasattr(source, 'fileno'):
+            return os.fstat(source.fileno()).st_size
+    except (OSError, ValueError, io.UnsupportedOperation):
+        pass
+    return None
+
+
+def peek(source):
+    """First bytes of a path or a seekable file, leaving the file where it was"""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            return f.read(config.PREFLIGHT_PEEK_BYTES)
+    if not (hasattr(source, 'seekable') and source.seekable()):
+        return None
+    position = source.tell()
+    try:
+        data = source.read(config.PREFLIGHT_PEEK_BYTES)
+    finally:
+        source.seek(position)
+    return data.encode() if isinstance(data, str) else data
+
+
+def estimate_read(func, source, size, arguments):
+    """
+    Rows, memory, columns and the text columns that look categorical of reading the complete file,
+    extrapolated from parsing its first bytes. All are None when the file is not delimited text or can't be sampled
+    """
+    compression = arguments.get('compression')
+    if func not in ['read_csv', 'read_table'] or compression not in (None, 'infer'):
+        return None, None, None, None
+    if isinstance(source, (str, os.PathLike)) and str(source).endswith(config.COMPRESSED_EXTENSIONS):
+        return None, None, None, None
+    data = peek(source)
+    if not data:
+        return None, None, None, None
+    if len(data) < size:
+        data = data[:data.rfind(b'\n') + 1]  # Complete lines only
+    kwargs = {arg: value for arg, value in passed_arguments(func, arguments).items()
+              if arg not in config.READ_PATH_ARGUMENTS + config.PREFLIGHT_SKIPPED_ARGUMENTS}
+    try:
+        sample = getattr(pd, func)(io.BytesIO(data), **kwargs)
+    except (ValueError, UnicodeDecodeError, pd.errors.ParserError):  # The first bytes don't parse on their own
+        return None, None, None, None
+    if sample.empty:
+        return None, None, None, None
+    scale = size / len(data)
+    categories = [col for col, uniques in sample.select_dtypes('object').nunique().items()
+                  if uniques <= len(sample) / config.CATEGORY_SHARE_THRESHOLD]
+    return int(len(sample) * scale), int(sample.memory_usage(deep=True).sum() * scale), sample.columns, categories
 
 
-@ledger.add_hint(config.WRITE_TEXT_METHODS, 'post')
+def passed_arguments(func, arguments):
+    """The arguments the caller gave to a call of `func` by their names, without the defaults it didn't pass"""
+    details = arguments.get('_dovpanda')
+    layout = config.REGISTRY['layouts'].get(func, [])
+    positional = [name for name, kind, _, _ in layout
+                  if kind in (inspect.Parameter.POSITIONAL_ONLY, inspect.Parameter.POSITIONAL_OR_KEYWORD)]
+    return dict(zip(positional, details.get('args')), **details.get('kwargs'))
+
+
+def has_pyarrow_engine():
+    version = tuple(int(part) for part in re.findall(r'\d+', pd.__version__)[:2])
+    return version >= (1, 4) and importlib.util.find_spec('pyarrow') is not None
+
+
+def human_bytes(size):
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size < 1000:
+            return f'{size:.0f} {unit}'
+        size /= 1000
+    return f'{size:.1f} TB'
+
+
+@ledger.add_hint(config.WRITE_TEXT_METHODS, 'post', reads=['path_or_buf', 'compression'])
 def suggest_zipping_on_to_csv(res, arguments):
     filename = arguments.get('path_or_buf')
     compression = arguments.get('compression', 'infer')
@@ -134,60 +665,211 @@ def suggest_zipping_on_to_csv(res, arguments):
                     f'<br><code>pd.{source_func}({filename}, compression=\'gzip\')</code>')
 
 
-@ledger.add_hint(config.READ_METHODS, 'post')
+def category_candidates(res, arguments):
+    """
+    Object columns of `res` with few enough unique values to be categorical, and their number of unique values.
+    Columns whose estimated unique values are clearly above the threshold are not counted exactly.
+    Values are counted on the complete result when `res` is a sample of it
+    """
+    full = arguments.get('_dovpanda').get('result', res)
+    threshold = int(full.shape[0] / config.CATEGORY_SHARE_THRESHOLD) + 1
+    stats = stats_of(full, arguments)
+    candidates = {}
+    for col in res.select_dtypes('object').columns:
+        if stats.nunique_estimate(col) > threshold * config.CARDINALITY_MARGIN:
+            continue
+        uniques = stats.nunique(col)
+        if uniques <= threshold:
+            candidates[col] = uniques
+    return candidates
+
+
+@ledger.add_hint(config.READ_METHODS, 'post', reads=[], on_large='sample', background=True)
 def suggest_category_dtype(res, arguments):
-    rows = res.shape[0]
-    threshold = int(rows / config.CATEGORY_SHARE_THRESHOLD) + 1
-    col_uniques = res.select_dtypes('object').nunique()
-    if col_uniques.empty:
+    if not hasattr(res, 'columns'):
         return
-    else:
-        obj_type = (col_uniques
-                    .loc[lambda x: x <= threshold]
-                    .to_dict())
+    rows = arguments.get('_dovpanda').get('rows', res.shape[0])
+    obj_type = category_candidates(res, arguments)
     for col, uniques in obj_type.items():
-        if uniques == 2:
-            dtype = 'boolean'
-            arbitrary = res.loc[:, col].at[0]
-            code = f"df['{col}'] = (df['{col}'] == '{arbitrary}')"
+        ledger.tell(category_message(col, uniques, rows, res[col]))
+
+
+def category_message(col, uniques, rows, values):
+    if uniques == 2:
+        dtype = 'boolean'
+        arbitrary = values.dropna().iloc[0]  # By position, whatever the index
+        code = f"df['{col}'] = (df['{col}'] == '{arbitrary}')"
+    else:
+        dtype = 'categorical'
+        code = f"df['{col}'] = df['{col}'].astype('category')"
+    return (f"Dataframe has {rows} rows. Column <code>{col}</code> has only {uniques} values "
+            f"which suggests it's a {dtype} feature.<br>"
+            f"After df is created, Consider converting it to {dtype} by using "
+            f"<code>{code}</code>")
+
+
+@ledger.add_hint(config.READ_METHODS + config.MERGE_DFS, 'post', reads=[], on_large='sample', background=True)
+def suggest_smaller_dtypes(res, arguments):
+    if not hasattr(res, 'columns') or res.empty or not stats_of(res, arguments).columns_are_unique:
+        return
+    details = arguments.get('_dovpanda')
+    rows = details.get('rows', res.shape[0])
+    current, smaller, mapping = dtype_savings(res, arguments, rows)
+    if current < config.MEMORY_ADVICE_BYTES or not mapping:
+        return
+    if current - smaller < current * config.MEMORY_SAVING_SHARE:
+        return
+    message = (f'Dataframe takes about {human_bytes(current)} in memory, but would fit in about '
+               f'{human_bytes(smaller)} with smaller dtypes. Consider converting it by using '
+               f'<code>df = df.astype({mapping})</code>')
+    ledger.tell(message)
+
+
+def dtype_savings(res, arguments, rows):
+    """
+    Estimated size in bytes of `res` now and with smaller dtypes, and the astype mapping to them.
+    Sizes come from the shallow memory usage, sampled string sizes and the value range of numeric columns.
+    Value ranges and precision are always checked on all the rows, so the mapping loses no values
+    """
+    stats = stats_of(arguments.get('_dovpanda').get('result', res), arguments)
+    scale = rows / res.shape[0]
+    usage = res.memory_usage(index=False, deep=False) * scale
+    categories = category_candidates(res, arguments)
+    current = smaller = 0
+    mapping = {}
+    for col, dtype in res.dtypes.items():
+        size = usage[col]
+        if dtype == object:
+            size += rows * string_size(res[col])
+        current += size
+        if col in categories:
+            uniques = categories[col]
+            new_dtype = 'category'
+            new_size = rows * np.min_scalar_type(-uniques).itemsize + uniques * (size / rows)
+        elif not isinstance(dtype, np.dtype):  # Already an extension dtype
+            new_dtype, new_size = None, size
+        elif dtype.kind in 'iu':
+            low, high = stats.bounds(col)
+            new_dtype = np.result_type(np.min_scalar_type(low), np.min_scalar_type(high))
+            new_size = rows * new_dtype.itemsize
+            new_dtype = new_dtype.name
+        elif dtype.kind == 'f' and dtype.itemsize > 4:
+            new_dtype, new_size = smaller_float(stats, col, rows)
         else:
-            dtype = 'categorical'
-            code = f"df['{col}'] = df['{col}'].astype('category')"
-        message = (f"Dataframe has {rows} rows. Column <code>{col}</code> has only {uniques} values "
-                   f"which suggests it's a {dtype} feature.<br>"
-                   f"After df is created, Consider converting it to {dtype} by using "
-                   f"<code>{code}</code>")
-        ledger.tell(message)
+            new_dtype, new_size = None, size
+        if new_dtype is None or new_size >= size:
+            smaller += size
+            continue
+        smaller += new_size
+        mapping[col] = new_dtype
+    return current, smaller, mapping
+
 
+def smaller_float(stats, col, rows):
+    """Smaller dtype for a float column and its size in bytes, or None if it needs all of its precision"""
+    low, high = stats.bounds(col)
+    if pd.isnull(low):
+        return None, 0
+    if stats.is_integral(col):
+        dtype = np.result_type(np.min_scalar_type(int(low)), np.min_scalar_type(int(high)))
+        if not stats.obj[col].hasnans:
+            return dtype.name, rows * dtype.itemsize
+        nullable = 'UInt' + dtype.name[4:] if dtype.kind == 'u' else 'Int' + dtype.name[3:]
+        return nullable, rows * (dtype.itemsize + 1)  # Nullable integers keep a mask byte per value
+    if stats.fits_float32(col):
+        return 'float32', rows * 4
+    return None, 0
 
-def is_date_time_format(arr):
+
+def string_size(column):
+    """Average size in bytes of the python objects of a text column, from a sample of it"""
+    sample = stratified_sample(column.to_numpy(), config.STRING_SAMPLE_SIZE)
+    if not len(sample):
+        return 0
+    return sum(sys.getsizeof(value) for value in sample) / len(sample)
+
+
+ISO_DATETIME = re.compile(r'\d{4}-\d{2}-\d{2}(?:[ T]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?)?(?:Z|[+-]\d{2}:?\d{2})?$')
+EPOCH = re.compile(r'\d{10}(?:\d{3})?$')  # dateutil reads these as out of range years
+
+
+def stratified_sample(arr, size):
     """
-    Check if a given array is a in a datetime format
+    Take evenly spaced values from `arr`, so its head, middle and tail are all represented
     Parameters
     ----------
-    arr
+    arr: 1d array
+    size: int
+        Maximal number of values to return
 
     Returns
     -------
+    array of at most `size` values
+    """
+    if len(arr) <= size:
+        return arr
+    positions = np.linspace(0, len(arr) - 1, num=size).astype(int)
+    return arr[positions]
 
+
+def is_date_time_format(arr, sample_size=None, confidence=None):
     """
-    try:
-        list(map(parser.parse, arr))
-    except (ValueError, TypeError):
+    Check if a given array is a in a datetime format.
+    Only a bounded sample of the array is checked, so the cost does not grow with its length
+    Parameters
+    ----------
+    arr: array-like
+    sample_size: int, optional
+        Number of values to check. Defaults to `config.DATETIME_SAMPLE_SIZE`
+    confidence: float, optional
+        Share of the checked values that must parse as datetimes. Defaults to `config.DATETIME_CONFIDENCE`
+
+    Returns
+    -------
+    bool
+    """
+    sample_size = sample_size or config.DATETIME_SAMPLE_SIZE
+    confidence = config.DATETIME_CONFIDENCE if confidence is None else confidence
+    arr = np.asarray(arr)
+    if arr.ndim != 1 or arr.dtype.kind not in 'OU':  # Numbers, bools and datetime64 are not datetime strings
+        return False
+    sample = stratified_sample(arr, sample_size)
+    sample = sample[pd.notnull(sample)]
+    if sample.size == 0:
         return False
-    return True
+    if pd.api.types.infer_dtype(sample, skipna=False) != 'string':  # Any non string is a clear non-match
+        return False
+    allowed_failures = int(sample.size * (1 - confidence))
+    values = pd.Series(sample)
+    iso = values.str.match(ISO_DATETIME.pattern)
+    epoch = values.str.match(EPOCH.pattern)
+    failures = epoch.sum() + pd.to_datetime(values[iso], errors='coerce').isnull().sum()
+    for value in values[~iso & ~epoch]:
+        if failures > allowed_failures:
+            return False
+        try:
+            parser.parse(value)
+        except (ValueError, OverflowError):
+            failures += 1
+    return failures <= allowed_failures
 
 
 def tell_time_dtype(col_name, arr):
-    if not np.issubdtype(arr.dtype, np.datetime64):
-        htype = np.typename(np.sctype2char(arr.dtype))  # Human readable type
+    message = time_dtype_message(col_name, arr.dtype)
+    if message:
+        ledger.tell(message)
+
+
+def time_dtype_message(col_name, dtype):
+    if not np.issubdtype(dtype, np.datetime64):
+        htype = np.typename(np.sctype2char(dtype))  # Human readable type
         # The content is in a datetime format but not in datetime type
-        ledger.tell(f"columns '{col_name}' looks like a datetime but the type is '{htype}'. "
-                    f"Consider using:<br>"
-                    f"<code>df['{col_name}'] = pd.to_datetime(df.{col_name})</code>")
+        return (f"columns '{col_name}' looks like a datetime but the type is '{htype}'. "
+                f"Consider using:<br>"
+                f"<code>df['{col_name}'] = pd.to_datetime(df.{col_name})</code>")
 
 
-@ledger.add_hint('DataFrame.insert')
+@ledger.add_hint('DataFrame.insert', reads=['column', 'value'])
 def data_in_date_format_insert(arguments):
     col = arguments.get('column')
     value = arguments.get('value')
@@ -196,7 +878,7 @@ def data_in_date_format_insert(arguments):
         tell_time_dtype(col, value_array)
 
 
-@ledger.add_hint('DataFrame.assign')
+@ledger.add_hint('DataFrame.assign', reads='kwargs')
 def data_in_date_format_assign(arguments):
     new_cols = arguments.get('kwargs')
     for col, value in new_cols.items():
@@ -205,7 +887,7 @@ def data_in_date_format_assign(arguments):
             tell_time_dtype(col, value_array)
 
 
-@ledger.add_hint('DataFrame.__setitem__')
+@ledger.add_hint('DataFrame.__setitem__', reads=['key', 'value'])
 def data_in_date_format_setitem(arguments):
     col = arguments.get('key')
     if len(base.listify(col)) > 1: # currently don't support setitem of 2 cols
@@ -216,40 +898,270 @@ def data_in_date_format_setitem(arguments):
         tell_time_dtype(col, value_array)
 
 
-@ledger.add_hint(config.READ_METHODS, 'post')
+@ledger.add_hint(config.READ_METHODS, 'post', reads=[], background=True)
 def data_in_date_format_read(res, arguments):
+    if not hasattr(res, 'columns'):
+        return
+    stats = stats_of(res, arguments)
     for col in res.columns:
-        value_array = np.asarray(res[col])
+        value_array = stats.column(col)
         if is_date_time_format(value_array):
             tell_time_dtype(col, value_array)
 
 
-@ledger.add_hint(config.GET_ITEM, 'post')
-def suggest_at_iat(res, arguments):
-    if not hasattr(res, 'shape'):
+@ledger.add_hint(config.GET_ITEM, reads=['self', 'key'])
+def suggest_at_iat(arguments):
+    indexer = arguments.get('self')
+    name = getattr(indexer, 'name', None)
+    if name not in ('loc', 'iloc'):
+        return
+    obj = indexer.obj
+    key = arguments.get('key')
+    keys = key if isinstance(key, tuple) else (key,)
+    if len(keys) != obj.ndim or not all(pd.api.types.is_scalar(k) for k in keys):
         return
-    self = arguments.get('self')
-    shp = res.shape
-    if res.ndim < 1:  # Sometimes specific slicing will return value
+    obj_name = config.ndim_to_obj.get(obj.ndim, 'object')
+    at = 'iat' if name == 'iloc' else 'at'
+    labels = 'row, col' if obj.ndim == 2 else 'row'
+    ledger.tell(f'You are reading a single value with <code>{obj_name}.{name}[{labels}]</code>, which goes through '
+                f'the general indexing of rows and columns. <code>{obj_name}.{at}[{labels}]</code> reads a single '
+                f'value directly, which adds up when it is done in a loop')
+
+
+@ledger.add_hint(['DataFrame.append', 'concat'], 'post', stop_nudge=config.MEMORY_SIZE, reads=['self', 'objs'])
+def dont_append_with_loop(res, arguments):
+    if arguments.get('self') is not None:
+        inputs = [arguments.get('self')]
+    else:
+        objs = arguments.get('objs')
+        inputs = objs.values() if isinstance(objs, Mapping) else objs
+    site = (ledger.caller.filename, ledger.caller.lineno)
+    chain = concat_growth.add(site, inputs, res, arguments.get('_dovpanda').get('elapsed'))
+    if chain.told or chain.calls < config.GROWTH_MIN_CALLS or chain.copied < config.GROWTH_MIN_BYTES:
         return
-    i = 'i' if isinstance(self, type(res.iloc)) else ''  # Help the user with at and iat
-    if all(dim == 1 for dim in shp):
-        obj = config.ndim_to_obj.get(res.ndim, 'object')
-        ledger.tell(f"The shape of the returned {obj} from slicing is {shp} "
-                    f"Which suggests you are interested in the value and not "
-                    f"in a new {obj}. Try instead: <br>"
-                    f"<code>{obj}.{i}at[row, col]</code>")
+    chain.told = True
+    ledger.tell(growth_message(chain))
+
+
+class GrowthChain:
+    """Successive calls from a single line, each growing the frame the previous one returned"""
+
+    def __init__(self):
+        self.calls = 0
+        self.copied = 0  # Bytes of all the results, as each call copies its inputs in full
+        self.elapsed = 0
+        self.first_size = None
+        self.size = 0
+        self.last = lambda: None
+        self.told = False
+
+    def add(self, res, elapsed):
+        """Count a call that returned `res`. Results are only sized once the chain continues, until it is told"""
+        if self.calls == 1:  # The first result is an input of this call, so it is still alive
+            self.first_size = self.size = self.copied = values_nbytes(self.last())
+        if self.calls and not self.told:
+            self.size = values_nbytes(res)
+            self.copied += self.size
+        self.calls += 1
+        self.elapsed += elapsed or 0
+        self.last = weakref.ref(res)
+
+    def projected(self):
+        """Bytes the next `calls` calls would copy if the frame keeps growing at the same pace"""
+        growth = (self.size - self.first_size) / max(self.calls - 1, 1)
+        return self.calls * self.size + growth * self.calls * (self.calls + 1) / 2
+
+
+class ConcatGrowth:
+    """
+    Growth chains of concat and append per line of code, for the latest `max_sites` lines.
+    A call continues the chain of its line when one of its inputs is what the line returned the last time
+    """
+
+    def __init__(self, max_sites):
+        self.max_sites = max_sites
+        self.sites = OrderedDict()
+
+    def add(self, site, inputs, res, elapsed):
+        chain = self.sites.pop(site, None)
+        if chain is None or not any(obj is chain.last() for obj in inputs):
+            chain = GrowthChain()
+        chain.add(res, elapsed)
+        self.sites[site] = chain
+        while len(self.sites) > self.max_sites:
+            self.sites.popitem(last=False)
+        return chain
+
+
+concat_growth = ConcatGrowth(config.MEMORY_SIZE)
+
+
+def values_nbytes(obj):
+    """Bytes of the values of a frame or series, with text counted as pointers. Unlike memory_usage, builds nothing"""
+    manager = getattr(obj, '_mgr', None)  # pandas >= 1.1
+    if manager is None:
+        manager = obj._data
+    return sum(block.values.nbytes for block in manager.blocks)
+
+
+def growth_message(chain):
+    return (f'This line grew the same dataframe {chain.calls} times, and every call copies all of it: '
+            f'{human_bytes(chain.copied)} copied in {human_seconds(chain.elapsed)} so far. '
+            f'The copying grows quadratically, another {chain.calls} calls would copy about '
+            f'{human_bytes(chain.projected())}.<br>'
+            f'It is a better practice to first create a list of dfs, and then '
+            f'<code>pd.concat(list_of_dfs)</code> in one go, copying about {human_bytes(chain.size)} once')
+
+
+MERGE_READS = ['left', 'right', 'self', 'other', 'how', 'on', 'left_on', 'right_on', 'left_index', 'right_index']
+
+
+@ledger.add_hint(['merge', 'DataFrame.merge', 'DataFrame.join'], reads=MERGE_READS)
+def predict_merge_size(arguments):
+    keys = merge_keys(arguments)
+    if not keys:
+        return
+    left_rows, right_rows = len(keys[0][1]), len(keys[0][3])
+    how = arguments.get('how') or 'inner'
+    rows, top, left_count, right_count = estimate_merge_rows(keys, how)
+    largest = max(left_rows, right_rows)
+    if rows < config.MERGE_EXPLOSION_ROWS or rows < largest * config.MERGE_EXPLOSION_FACTOR:
+        return
+    left, right = merge_sides(arguments)
+    row_bytes = base.nbytes(left) / max(left_rows, 1) + base.nbytes(right) / max(right_rows, 1)
+    func = arguments.get('_dovpanda').get('source_func_name')
+    message = (f'This {func} is estimated to return about {rows:,.0f} rows (about {human_bytes(rows * row_bytes)}) '
+               f'from {left_rows:,} and {right_rows:,} rows, as key values repeat on both sides: '
+               f'<code>{top!r}</code> appears about {left_count:,.0f} times on the left and {right_count:,.0f} '
+               f'times on the right, and every pair of them makes a row.<br>'
+               f'Check the keys are the ones you meant, or drop the repetitions on one side first with '
+               f'<code>drop_duplicates(subset=...)</code>')
+    if func == 'merge':
+        message += ". <code>validate='one_to_many'</code> makes pandas raise on such keys instead"
+    if MISSING_KEY in (top if isinstance(top, tuple) else (top,)):
+        message += ('.<br>Missing key values match each other in a merge, drop them first with '
+                    '<code>dropna(subset=...)</code> if they should not')
+    ledger.tell(message)
+
+
+@ledger.add_hint(['merge', 'DataFrame.merge', 'DataFrame.join', 'merge_asof'], reads=MERGE_READS)
+def merge_key_dtypes(arguments):
+    for left_name, left_values, right_name, right_values in merge_keys(arguments):
+        left_dtype, right_dtype = left_values.dtype, right_values.dtype
+        left_categorical, right_categorical = is_categorical(left_dtype), is_categorical(right_dtype)
+        if left_categorical and right_categorical:
+            if left_values.cat.categories.equals(right_values.cat.categories):
+                continue
+            problem = 'categorical with different categories on each side'
+        elif left_categorical or right_categorical:
+            problem = f'{left_dtype} on the left and {right_dtype} on the right'
+        elif (left_dtype == object) != (right_dtype == object):
+            problem = f'{left_dtype} on the left and {right_dtype} on the right'
+        else:
+            continue
+        key = left_name if left_name == right_name else f'{left_name}</code> / <code>{right_name}'
+        ledger.tell(f'Merge key <code>{key}</code> is {problem}. '
+                    f'pandas has to convert the keys to a common type on every merge, '
+                    f'which is slow or fails to match equal values. '
+                    f'Convert one side to the dtype of the other once, before merging')
+
+
+def is_categorical(dtype):
+    return str(dtype) == 'category'
+
+
+def merge_sides(arguments):
+    left = arguments.get('left') if arguments.get('left') is not None else arguments.get('self')
+    right = arguments.get('right') if arguments.get('right') is not None else arguments.get('other')
+    return left, right
+
+
+def merge_keys(arguments):
+    """
+    (left name, left values, right name, right values) of every key of a merge or join.
+    Empty when the keys can't be told, e.g. for keys given as arrays or a join of many frames
+    """
+    left, right = merge_sides(arguments)
+    if isinstance(right, pd.Series) and right.name is not None:
+        right = right.to_frame()
+    if not isinstance(left, pd.DataFrame) or not isinstance(right, pd.DataFrame):
+        return []
+    if arguments.get('_dovpanda').get('source_func_name') == 'join':
+        left_on, right_on = arguments.get('on'), None
+        left_index, right_index = left_on is None, True
+    else:
+        on = arguments.get('on')
+        left_on = on if arguments.get('left_on') is None else arguments.get('left_on')
+        right_on = on if arguments.get('right_on') is None else arguments.get('right_on')
+        left_index, right_index = bool(arguments.get('left_index')), bool(arguments.get('right_index'))
+        if left_on is None and right_on is None and not left_index and not right_index:
+            left_on = right_on = [col for col in left.columns if col in right.columns]
+    left_keys, right_keys = key_values(left, left_on, left_index), key_values(right, right_on, right_index)
+    if not left_keys or left_keys is None or right_keys is None or len(left_keys) != len(right_keys):
+        return []
+    return [left_key + right_key for left_key, right_key in zip(left_keys, right_keys)]
+
+
+def key_values(frame, on, use_index):
+    """(name, values) of the keys of one side of a merge, or None if they are not labels of `frame`"""
+    if use_index:
+        return [(name if name is not None else 'index', frame.index.get_level_values(level))
+                for level, name in enumerate(frame.index.names)]
+    keys = []
+    for col in base.listify(on) or []:
+        try:
+            if col not in frame.columns or not frame.columns.is_unique:
+                return None
+        except TypeError:  # An array of keys
+            return None
+        keys.append((col, frame[col]))
+    return keys
+
+
+def estimate_merge_rows(keys, how):
+    """
+    Estimated rows of a merge from sampled counts of the key values on each side, and the key value that
+    repeats the most on both sides with its estimated counts. Key values repeating on both sides show
+    in the samples of both, and they are what makes a merge explode
+    """
+    left_counts, left_share = sampled_key_counts([key[1] for key in keys])
+    right_counts, right_share = sampled_key_counts([key[3] for key in keys])
+    pairs = left_counts.mul(right_counts).dropna()
+    matched = pairs.sum() / (left_share * right_share)
+    left_rows, right_rows = len(keys[0][1]), len(keys[0][3])
+    rows = {'left': max(matched, left_rows), 'right': max(matched, right_rows),
+            'outer': max(matched, left_rows, right_rows)}.get(how, matched)
+    if pairs.empty:
+        return rows, None, 0, 0
+    top = pairs.idxmax()
+    return rows, top, left_counts[top] / left_share, right_counts[top] / right_share
+
+
+def sampled_key_counts(values):
+    """Counts of the key values in a random sample of rows, and the share of the rows sampled"""
+    rows = len(values[0])
+    if rows > 2 * config.MERGE_SAMPLE_SIZE:
+        positions = np.unique(np.random.RandomState(0).randint(0, rows, config.MERGE_SAMPLE_SIZE))
+    else:
+        positions = np.arange(rows)
+    sample = pd.DataFrame({i: np.asarray(value.take(positions)) for i, value in enumerate(values)})
+    missing = sample.isnull()
+    if missing.values.any():  # merge matches missing keys to each other, where groupby drops them
+        sample = sample.astype(object).where(~missing, MISSING_KEY)
+    return sample.groupby(list(sample.columns), sort=False).size(), len(positions) / max(rows, 1)
+
+
+class MissingKey:
+    """Stands for the missing values of merge keys, as all of them match each other"""
+
+    def __repr__(self):
+        return 'NaN'
 
 
-@ledger.add_hint(['DataFrame.append', 'concat'], stop_nudge=4)
-def dont_append_with_loop(arguments):
-    if ledger.similar >= 4:
-        ledger.tell('dont append or concat dfs iteratively. '
-                    'it is a better practice to first create a list of dfs. '
-                    'and then <code>pd.concat(list_of_dfs)</code> in one go')
+MISSING_KEY = MissingKey()
 
 
-@ledger.add_hint('Series.str.split', 'post')
+@ledger.add_hint('Series.str.split', 'post', reads=['expand', 'pat'])
 def suggest_expand(res, arguments):
     expand = arguments.get('expand')
     pat = arguments.get('pat')
@@ -265,7 +1177,7 @@ def suggest_expand(res, arguments):
                 f'<code>df.{col}.str.split("{pat}", expand=True)</code>')
 
 
-@ledger.add_hint(config.methods_by_argument('inplace'))
+@ledger.add_hint(config.methods_by_argument('inplace'), reads='inplace')
 def inplace_returns_none(arguments):
     caller = ledger.caller
     func = arguments.get('_dovpanda').get('source_func_name')
@@ -0,0 +1,27 @@
+import os
+import tempfile
+
+import pytest
+
+CACHE_DIR = tempfile.TemporaryDirectory(prefix='dovpanda-cache-')  # Keep the tests out of the user's cache
+os.environ['DOVPANDA_CACHE_DIR'] = CACHE_DIR.name
+
+import dovpanda  # noqa: E402
+from dovpanda import config  # noqa: E402
+
+
+@pytest.fixture
+def told():
+    messages = []
+    dovpanda.set_output(lambda teller: messages.append((teller.message, teller.caller)))
+    yield messages
+    dovpanda.set_output('display')
+
+
+@pytest.fixture
+def forget_calls():
+    """Tell about every call, even one repeated from the same line, e.g. by parametrized tests"""
+    size = config.MEMORY_SIZE
+    dovpanda.set_memory_size(0)
+    yield
+    dovpanda.set_memory_size(size)
@@ -0,0 +1,291 @@
+import gc
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import weakref
+from itertools import chain
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import dovpanda
+from dovpanda import base, config
+from dovpanda.core import ledger
+
+
+def test_caller_reads_source_lazily():
+    caller = base.Caller.from_frame(sys._getframe())
+    assert caller.filename == __file__
+    assert 'caller = base.Caller' in caller.code_context[0]
+
+
+def test_tell_points_to_calling_line(told):
+    df = pd.DataFrame({'A': [1, 2]})
+    df == df
+    message, caller = told[-1]
+    assert 'df1.equals(df2)' in message
+    assert caller.filename == __file__
+    assert caller.code_context[0].strip() == 'df == df'
+
+
+def _binder_target(a, b=2, *args, c=3, **kwargs):
+    pass
+
+
+@pytest.mark.parametrize('names, args, kwargs, expected', [
+    (None, (1,), {}, {'a': 1, 'b': 2, 'args': (), 'c': 3, 'kwargs': {}}),
+    (None, (1, 5, 6), {'c': 7, 'd': 8}, {'a': 1, 'b': 5, 'args': (6,), 'c': 7, 'kwargs': {'d': 8}}),
+    ({'b'}, (), {'a': 1, 'b': 4}, {'b': 4}),
+    (set(), (1,), {}, {}),
+])
+def test_binder_matches_signature_bind(names, args, kwargs, expected):
+    arguments = base.Binder(_binder_target, names).bind(args, kwargs)
+    assert arguments.pop('_dovpanda')['source_func_name'] == '_binder_target'
+    assert arguments == expected
+
+
+def test_binder_is_cached_per_function():
+    names = base.bound_names(ledger.hints['concat'])
+    original = ledger.original_methods['concat']
+    assert names == {'objs', 'axis', 'self'}  # append's hints read self, which concat doesn't have
+    assert ledger.get_binder(original, names) is ledger.get_binder(original, names)
+    assert {name for name, _, _ in ledger.get_binder(original, names).bound} == {'objs', 'axis'}
+
+
+def test_memory_counts_calls_in_window():
+    memory = base.Memory(maxlen=3)
+    assert [memory.append(call) for call in 'aabaa'] == [1, 2, 1, 2, 2]
+    assert list(memory) == list('baa')
+    memory.resize(1)
+    assert list(memory) == ['a']
+    assert memory.append('b') == 1
+    assert dict(memory.counts) == {'b': 1}
+
+
+def test_memory_size_can_be_set_after_import():
+    size = config.MEMORY_SIZE
+    df = pd.DataFrame({'A': [1, 2]})
+    sizes = []
+    try:
+        dovpanda.set_memory_size(4)
+        assert ledger.memory.maxlen == 4
+        thread = threading.Thread(target=lambda: (df == df, sizes.append(ledger.memory.maxlen)))
+        thread.start()
+        thread.join()
+    finally:
+        dovpanda.set_memory_size(size)
+    assert sizes == [4] and ledger.memory.maxlen == size
+    df == df
+    assert list(ledger.memory)[-1][1:] == (__file__, sys._getframe().f_lineno - 1)
+
+
+def test_restricted_dirs_are_cached_and_extendable(tmp_path, monkeypatch):
+    restricted = base.Ledger()
+    inside = str(tmp_path / 'wrapper' / 'lib.py')
+    assert not restricted.is_restricted(inside)
+    assert restricted.is_restricted(base.__file__)
+    restricted.add_restricted_dirs(tmp_path / 'wrapper')
+    assert restricted.is_restricted(inside)
+    assert not restricted.is_restricted(str(tmp_path / 'wrapper_other.py'))
+    monkeypatch.chdir(tmp_path)
+    restricted.add_restricted_dirs('src/wrappers')
+    assert restricted.is_restricted(str(tmp_path / 'src' / 'wrappers' / 'lib.py'))
+    assert restricted.is_restricted(os.path.join('src', 'wrappers', 'other.py'))
+
+
+def test_muted_calls_skip_hooks():
+    df = pd.DataFrame({'A': [1, 2]})
+    calls = len(ledger.memory)
+    with dovpanda.mute():
+        df == df
+    assert len(ledger.memory) == calls
+    assert not ledger.teller.silent
+
+
+def test_exhausted_call_site_skips_hints(told):
+    df = pd.DataFrame({'A': [1, 2]})
+    for _ in range(3):
+        df == df
+    assert len(told) == 1
+
+
+def test_binder_from_stored_layout():
+    layout = json.loads(json.dumps(base.Binder.describe(_binder_target)))
+    arguments = base.Binder(_binder_target, layout=layout).bind((1, 5, 6), {'d': 8})
+    expected = base.Binder(_binder_target).bind((1, 5, 6), {'d': 8})
+    assert arguments.keys() == expected.keys()
+    assert all(arguments[name] == expected[name] for name in 'a b args c kwargs'.split())
+
+
+def test_registry_has_hooked_layouts():
+    assert 'concat' in config.REGISTRY['layouts']
+    assert config.registry_path().exists()
+    assert str(config.CACHE_DIR) == os.environ['DOVPANDA_CACHE_DIR']
+
+
+@pytest.mark.parametrize('cached', ['{}', '{"PD_ALL": [], "DF_ALL": [], "SERIES_ALL": []}', '[]', 'not json'])
+def test_registry_is_computed_again_when_incomplete(tmp_path, monkeypatch, cached):
+    monkeypatch.setattr(config, 'CACHE_DIR', tmp_path)
+    config.registry_path().write_text(cached)
+    registry = config.load_registry()
+    assert config.REGISTRY_KEYS.issubset(registry) and 'concat' in registry['PD_ALL']
+    assert config.REGISTRY_KEYS.issubset(json.loads(config.registry_path().read_text()))
+
+
+def test_large_results_are_sampled_or_skipped(told, monkeypatch):
+    monkeypatch.setattr(config, 'HINT_ROW_BUDGET', 10)
+    monkeypatch.setattr(config, 'HINT_SAMPLE_ROWS', 5)
+    df = pd.DataFrame({'A': ['x', 'y'] * 10})
+    pd.concat([df, df])
+    assert 'Skipped <code>duplicate_index_after_concat</code>' in told[-1][0]
+    assert not any('duplicated indices' in message for message, _ in told)
+    res = df[['A']]
+    hint = next(hint for hint in ledger.hints['read_csv'] if hint.on_large == 'sample')
+    call_stats = base.CallStats()
+    sampled, arguments = ledger._fit_to_budget(hint, (res, {'_dovpanda': {'stats': call_stats}}))
+    assert len(sampled) == 5
+    assert arguments['_dovpanda'].pop('result') is res
+    assert arguments['_dovpanda'] == {'rows': 20, 'sampled': True, 'stats': call_stats}
+    other = next(hint for hint in ledger.hints['read_csv'] if hint.replacement.__name__ == 'suggest_smaller_dtypes')
+    assert ledger._fit_to_budget(other, (res, {'_dovpanda': {'stats': call_stats}}))[0] is sampled
+
+
+def test_time_budget_skips_remaining_hints(told, monkeypatch):
+    monkeypatch.setattr(config, 'HINT_TIME_BUDGET', -1)
+    df = pd.DataFrame({'A': [1, 2]})
+    df == df
+    assert 'Skipped <code>df_check_equality</code>' in told[-1][0]
+
+
+def test_background_hints_tell_with_their_caller(told, tmp_path):
+    path = tmp_path / 'data.csv'
+    pd.DataFrame({'A': range(3)}).to_csv(path)
+    dovpanda.set_background(workers=1)
+    try:
+        pd.read_csv(str(path))
+        dovpanda.wait()
+    finally:
+        dovpanda.set_background(False)
+    message, caller = told[-1]
+    assert 'index_col=0' in message
+    assert caller.code_context[0].strip() == 'pd.read_csv(str(path))'
+
+
+def test_stats_record_hooked_methods_and_hints():
+    df = pd.DataFrame({'A': [1, 2]})
+    dovpanda.set_profiling()
+    try:
+        dovpanda.reset_stats()
+        df == df
+        stats = dovpanda.stats().set_index(['kind', 'name'])
+    finally:
+        dovpanda.set_profiling(False)
+    assert stats.loc[('hooked', 'DataFrame.__eq__'), 'calls'] == 1
+    assert stats.loc[('hint', 'df_check_equality'), 'calls'] == 1
+    assert (stats['total'] >= stats['frame'] + stats['binding']).all()
+    assert dovpanda.stats().empty
+
+
+def test_stats_are_shared_within_a_call():
+    df = pd.DataFrame({'A': ['x', 'y', 'x'], 'B': [1, 2, 3]}, index=[0, 0, 1])
+    call_stats = base.CallStats()
+    stats = call_stats.of(df)
+    assert call_stats.of(df) is stats
+    assert not stats.index_is_unique and stats.columns_are_unique
+    assert stats.nunique('A') == 2
+    assert stats.nunique_estimate('A') == 2
+    frames = call_stats.of([df, df.A]).frames
+    assert (frames.count, frames.rows, frames.widths, frames.column_names) == (2, {3}, {1, 2}, {'A', 'B'})
+
+
+def test_frames_summary_reads_every_frame():
+    df = pd.DataFrame({'A': [1], 'B': [2]})
+    objs = (df if i % 3 else None for i in range(1500))
+    frames = base.summarize_frames(chain(objs, [pd.DataFrame({'C': [1, 2]})]))
+    assert frames.count == 1501
+    assert (frames.rows, frames.widths, frames.column_names) == ({1, 2}, {1, 2}, {'A', 'B', 'C'})
+
+
+def test_one_shot_objs_reach_both_hints_and_pandas(told):
+    df = pd.DataFrame({'A': [1, 2], 'B': [3, 4]})
+    result = pd.concat(frame for frame in [df, df])
+    assert len(result) == 4
+    assert any('same columns and same number of rows' in message for message, _ in told)
+    assert len(pd.concat(objs=iter([df, df, df]), axis='columns').columns) == 6
+
+
+@pytest.mark.parametrize('values, low, high', [
+    (np.arange(100000).astype(str), 50000, 100000),
+    (np.random.RandomState(0).choice(list('abc'), 100000), 3, 3),
+])
+def test_estimate_nunique(values, low, high):
+    assert low <= base.estimate_nunique(pd.Series(values), 1000) <= high
+
+
+def test_threads_keep_their_own_call_details(told):
+    df = pd.DataFrame({'A': [1, 2]})
+    barrier = threading.Barrier(8)
+
+    def compare(i):
+        barrier.wait()
+        for _ in range(50):
+            if i % 2:
+                df == df
+            else:
+                df.A == df.A
+
+    threads = [threading.Thread(target=compare, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    frames = [caller.lineno for message, caller in told if message.startswith('Calling df1 == df2')]
+    series = [caller.lineno for message, caller in told if message.startswith('Calling series1 == series2')]
+    assert len(frames) == len(series) == 4  # Once per thread, the repeats are counted per thread
+    assert len(set(frames)) == len(set(series)) == 1 and frames[0] + 2 == series[0]
+
+
+def _compare_in_worker():
+    df = pd.DataFrame({'A': [1, 2]})
+    df == df
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='Workers are forked to share the hooked pandas')
+def test_worker_hints_are_collected_into_one_report(told, tmp_path):
+    dovpanda.set_collecting(path=tmp_path)
+    try:
+        workers = [multiprocessing.get_context('fork').Process(target=_compare_in_worker) for _ in range(3)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        assert not told  # Workers don't tell
+        collected = dovpanda.report()
+    finally:
+        dovpanda.set_collecting(False)
+    assert len(collected) == 1
+    row = collected.iloc[0]
+    assert (row.hint, row.lineno) == ('df_check_equality', _compare_in_worker.__code__.co_firstlineno + 2)
+    assert row['count'] == row.processes == 3 and 'df1.equals(df2)' in row.message
+    message, caller = told[-1]
+    assert '3 times in 3 processes' in message and caller.code_context[0].strip() == 'collected = dovpanda.report()'
+
+
+def test_collecting_cleans_up_after_itself(told):
+    path = dovpanda.set_collecting()
+    try:
+        with open(os.path.join(path, '1.jsonl'), 'w') as f:
+            f.write(json.dumps({'hint': 'df_check_equality', 'file': __file__, 'line': 1, 'cost': None}) + '\n')
+        assert ledger.report()['count'].tolist() == [1]
+    finally:
+        dovpanda.set_collecting(False)
+    assert told[-1][1].code_context[0].strip() == "assert ledger.report()['count'].tolist() == [1]"
+    assert not os.path.exists(path)
+    collecting = base.Ledger()
+    collected = weakref.ref(collecting)
+    del collecting
+    gc.collect()
+    assert collected() is None
@@ -1,3 +1,5 @@
+import re
+
 import numpy as np
 import pandas as pd
 import pytest
@@ -16,4 +18,313 @@ import dovpanda
 def test_wrong_concat_axis(axis):
     expected = c[axis]
     result = pd.concat((df1, df2), axis=axis)
-    pd.testing.assert_frame_equal(result, expected)
\ No newline at end of file
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_concat_axis_hint_sees_every_frame(told):
+    df = pd.DataFrame({'A': [1, 2], 'B': [3, 4]})
+    frames = [df] * 1500
+    frames[777] = pd.DataFrame({'C': [1, 2, 3]})
+    pd.concat(frames, axis=1, sort=False)
+    assert not any('same columns and same number of rows' in message for message, _ in told)
+
+
+@pytest.mark.parametrize('values, expected', [
+    (['2019-01-01', '2019-02-01 10:00', '2019-03-01T10:00:00Z'], True),
+    (['Jan 1 2019', 'Feb 2, 2019', '03/03/2019'], True),
+    (['bear', 'panda', 'koala'], False),
+    (['1572393600', '1572393601'], False),
+    ([1, 2, 3], False),
+    (['2019-01-01', 3], False),
+])
+def test_is_date_time_format(values, expected):
+    from dovpanda import core
+    assert core.is_date_time_format(np.asarray(values, dtype=object)) == expected
+
+
+def test_is_date_time_format_samples_long_arrays():
+    from dovpanda import core
+    values = np.array(['2019-01-01'] * 10000 + ['bear'] * 10, dtype=object)
+    assert core.is_date_time_format(values, sample_size=100)
+    assert not core.is_date_time_format(values, sample_size=100, confidence=1)
+
+
+def test_at_iat_suggested_for_scalar_lookups_only(told):
+    df = pd.DataFrame({'A': [1], 'B': [2]})
+    df['A']
+    df[['A']]
+    df.loc[[0], ['A']]
+    df.iloc[0]
+    assert not told
+    assert df.loc[0, 'A'] == 1
+    assert df.iloc[0, 1] == 2
+    assert df.A.iloc[0] == 1
+    messages = [message for message, _ in told]
+    assert len(messages) == 3
+    assert '<code>df.at[row, col]</code>' in messages[0] and '<code>df.iat[row, col]</code>' in messages[1]
+    assert '<code>series.iat[row]</code>' in messages[2]
+
+
+def test_chunked_read_csv_tells_once_when_exhausted(told, tmp_path):
+    path = str(tmp_path / 'data.csv')
+    pd.DataFrame({'label': ['bear', 'panda'] * 10, 'day': ['2019-01-01'] * 20}).to_csv(path, index=False)
+    reader = pd.read_csv(path, chunksize=6)
+    chunks = [len(chunk) for chunk in reader]
+    messages = [message for message, _ in told]
+    assert chunks == [6, 6, 6, 2]
+    assert len(messages) == 1
+    assert 'Read 20 rows in 4 chunks' in messages[0]
+    assert 'Column <code>label</code> has only 2 values' in messages[0]
+    assert "columns 'day' looks like a datetime" in messages[0]
+
+
+@pytest.mark.parametrize('as_source', [str, lambda path: path, lambda path: open(str(path), 'rb')])
+def test_preflight_read_estimates_large_files(told, forget_calls, tmp_path, monkeypatch, as_source):
+    from dovpanda import config
+    monkeypatch.setattr(config, 'MAX_CSV_SIZE', 1000)
+    monkeypatch.setattr(config, 'PREFLIGHT_PEEK_BYTES', 500)
+    path = tmp_path / 'data.csv'
+    pd.DataFrame({'label': ['bear', 'panda'] * 500, 'value': range(1000)}).to_csv(str(path), index=False)
+    source = as_source(path)
+    df = pd.read_csv(source)
+    if hasattr(source, 'close'):
+        source.close()
+    assert len(df) == 1000
+    preflight = next(message for message, _ in told if 'may take time to load' in message)
+    rows = int(re.search(r'about ([\d,]+) rows', preflight).group(1).replace(',', ''))
+    assert 800 < rows < 1200
+    assert "dtype={'label': 'category'}" in preflight
+
+
+@pytest.mark.parametrize('kwargs', [{'encoding': 'latin-1'}, {'encoding': 'latin-1', 'skiprows': 2, 'header': None}])
+def test_preflight_read_passes_on_parse_arguments(told, forget_calls, tmp_path, monkeypatch, kwargs):
+    from dovpanda import config
+    monkeypatch.setattr(config, 'MAX_CSV_SIZE', 1000)
+    monkeypatch.setattr(config, 'PREFLIGHT_PEEK_BYTES', 500)
+    path = tmp_path / 'data.csv'
+    pd.DataFrame({'label': ['ours', 'bär'] * 500, 'value': range(1000)}).to_csv(str(path), index=False,
+                                                                              encoding='latin-1')
+    df = pd.read_csv(str(path), **kwargs)
+    assert len(df) == 1001 - kwargs.get('skiprows', 1)
+    assert not any('SAD PANDA' in message for message, _ in told)
+    preflight = next(message for message, _ in told if 'may take time to load' in message)
+    assert 'rows and 2 columns' in preflight
+
+
+def test_preflight_read_falls_back_to_the_file_size(told, tmp_path, monkeypatch):
+    from dovpanda import config
+    monkeypatch.setattr(config, 'MAX_CSV_SIZE', 1000)
+    path = tmp_path / 'data.csv'
+    path.write_bytes('label\n'.encode() + 'bär\n'.encode('latin-1') * 500)
+    with pytest.raises(UnicodeDecodeError):
+        pd.read_csv(str(path))
+    preflight = next(message for message, _ in told if 'may take time to load' in message)
+    assert preflight.startswith('File is 2 KB, so') and 'SAD PANDA' not in ''.join(message for message, _ in told)
+
+
+def test_preflight_read_suggests_only_arguments_of_the_method(told, tmp_path, monkeypatch):
+    from dovpanda import config, core
+    monkeypatch.setattr(config, 'MAX_CSV_SIZE', 1000)
+    path = str(tmp_path / 'data.pkl')
+    pd.DataFrame({'value': range(1000)}).to_pickle(path)
+    pd.read_pickle(path)
+    preflight = next(message for message, _ in told if 'may take time to load' in message)
+    assert 'nrows' not in preflight
+    arguments = {'_dovpanda': {'args': ('data.csv', ';'), 'kwargs': {'encoding': 'latin-1'}}}
+    assert core.passed_arguments('read_csv', arguments) == {'filepath_or_buffer': 'data.csv', 'sep': ';',
+                                                            'encoding': 'latin-1'}
+
+
+def test_category_dtype_suggested_whatever_the_index(told):
+    import io
+    csv = pd.DataFrame({'id': range(100, 140), 'kind': ['bear', 'panda', 'koala', 'bear'] * 10,
+                        'cute': ['yes', 'no'] * 20}).to_csv(index=False)
+    pd.read_csv(io.StringIO(csv), index_col='id')
+    messages = [message for message, _ in told]
+    assert not any('SAD PANDA' in message for message in messages)
+    assert any("df['kind'].astype('category')" in message for message in messages)
+    assert any("df['cute'] = (df['cute'] == 'yes')" in message for message in messages)
+
+
+def test_category_values_are_counted_on_all_rows_of_sampled_reads(told, monkeypatch):
+    import io
+    from dovpanda import base, config
+    monkeypatch.setattr(config, 'HINT_ROW_BUDGET', 1000)
+    monkeypatch.setattr(config, 'HINT_SAMPLE_ROWS', 2000)
+    df = pd.DataFrame({'label': ['a', 'b', 'c'] * 2000})
+    assert set(base.sample_rows(df, 2000)['label']) == {'a', 'b', 'c'}  # A stride of 3 would see only 'a'
+    pd.read_csv(io.StringIO(df.to_csv(index=False)))
+    category = next(message for message, _ in told if 'Column <code>label</code>' in message)
+    assert 'has only 3 values' in category
+
+
+def test_smaller_dtypes_mapping_applies_and_shrinks(told, monkeypatch):
+    import ast
+    import io
+    from dovpanda import config
+    monkeypatch.setattr(config, 'MEMORY_ADVICE_BYTES', 1000)
+    rows = 3000
+    csv = pd.DataFrame({'id': range(rows), 'score': [float(i % 50) if i % 7 else None for i in range(rows)],
+                        'label': ['bear', 'panda', 'koala'] * (rows // 3), 'ratio': np.random.rand(rows)}).to_csv()
+    df = pd.read_csv(io.StringIO(csv), index_col=0)
+    dovpanda.wait()
+    advice = next(message for message, _ in told if 'smaller dtypes' in message)
+    mapping = ast.literal_eval(re.search(r'astype\((\{.*?\})\)', advice).group(1))
+    assert mapping == {'id': 'uint16', 'score': 'UInt8', 'label': 'category'}
+    smaller = df.astype(mapping)
+    assert smaller.memory_usage(deep=True).sum() < df.memory_usage(deep=True).sum() / 2
+    pd.testing.assert_series_equal(smaller['score'].astype(float), df['score'])
+
+
+def test_smaller_dtypes_hold_the_values_left_out_of_the_sample(told, monkeypatch):
+    import ast
+    from dovpanda import config
+    monkeypatch.setattr(config, 'MEMORY_ADVICE_BYTES', 1000)
+    monkeypatch.setattr(config, 'HINT_ROW_BUDGET', 1000)
+    monkeypatch.setattr(config, 'HINT_SAMPLE_ROWS', 500)
+    rows = 3000
+    df = pd.DataFrame({'id': np.arange(rows) % 200, 'score': np.arange(rows) % 50 * 1.0, 'ratio': np.ones(rows)})
+    df.loc[1, ['id', 'score', 'ratio']] = [100000, 0.5, 1 / 3]  # Only row 1 needs the larger dtypes
+    pd.concat([df])
+    advice = next(message for message, _ in told if 'smaller dtypes' in message)
+    mapping = ast.literal_eval(re.search(r'astype\((\{.*?\})\)', advice).group(1))
+    assert mapping == {'id': 'uint32', 'score': 'float32'}
+    pd.testing.assert_frame_equal(df.astype(mapping).astype(df.dtypes), df)
+
+
+@pytest.fixture
+def loop_tells(told, monkeypatch):
+    from dovpanda import config
+    monkeypatch.setattr(config, 'LOOP_TIME_THRESHOLD', 0)
+    return told
+
+
+def test_row_loop_is_timed_without_changing_the_rows(loop_tells):
+    df = pd.DataFrame({'a': range(2000), 'b': range(2000)})
+    assert [tuple(row) for _, row in df.iterrows()] == list(zip(range(2000), range(2000)))
+    assert list(df.itertuples(index=False)) == list(zip(range(2000), range(2000)))
+    loops = [message for message, _ in loop_tells if 'rows per second' in message]
+    assert len(loops) == 2
+    assert 'df.itertuples()</code> is much faster' in loops[0]
+
+
+def test_small_row_loops_are_not_timed(loop_tells):
+    df = pd.DataFrame({'a': range(10)})
+    for _ in df.iterrows():
+        pass
+    df.apply(lambda row: row['a'] * 2, axis=1)
+    assert not [message for message, _ in loop_tells if 'rows per second' in message]
+
+
+def test_row_apply_names_the_vectorized_alternative(loop_tells):
+    df = pd.DataFrame({'a': range(2000), 'b': range(2000)})
+    df.apply(lambda row: (row['a'] + row.b) * 2 - np.sqrt(row['b']), axis=1)
+    df.apply(np.sum)
+    apply_tells = [message for message, _ in loop_tells if 'rows per second' in message]
+    assert len(apply_tells) == 1
+    assert "<code>(df['a'] + df['b']) * 2 - np.sqrt(df['b'])</code>" in apply_tells[0]
+
+
+def test_frame_grown_in_a_loop_is_told_once(told, monkeypatch):
+    from dovpanda import config
+    monkeypatch.setattr(config, 'GROWTH_MIN_BYTES', 0)
+    part = pd.DataFrame({'a': range(100)})
+    other = pd.DataFrame({'a': range(10)})
+    for _ in range(20):
+        pd.concat([part, other])  # Repeated, but nothing grows
+    grown = part
+    for _ in range(20):
+        grown = pd.concat([grown, part], ignore_index=True)
+    for _ in range(20):
+        grown = grown.append(part, ignore_index=True)
+    loops = [message for message, _ in told if 'grew the same dataframe' in message]
+    assert len(loops) == 2
+    assert loops[0].startswith(f'This line grew the same dataframe {config.GROWTH_MIN_CALLS} times')
+
+
+def test_merge_explosion_is_predicted_before_merging(told, monkeypatch):
+    from dovpanda import config
+    monkeypatch.setattr(config, 'MERGE_SAMPLE_SIZE', 1000)
+    monkeypatch.setattr(config, 'MERGE_EXPLOSION_ROWS', 0)
+    left = pd.DataFrame({'key': np.arange(20000) % 10, 'a': 1})
+    right = pd.DataFrame({'key': np.arange(200) % 10, 'b': 2})
+    pd.merge(left, right.drop_duplicates('key'), on='key')
+    left.merge(right)
+    messages = [message for message, _ in told]
+    predictions = [message for message in messages if 'is estimated to return' in message]
+    assert len(predictions) == 1
+    rows = int(re.search(r'about ([\d,]+) rows', predictions[0]).group(1).replace(',', ''))
+    assert 300000 < rows < 500000  # 400,000 rows
+    assert not [message for message in messages if 'Merge key' in message]
+
+
+def test_merge_explosion_of_missing_keys_is_predicted(told, monkeypatch):
+    from dovpanda import config
+    monkeypatch.setattr(config, 'MERGE_EXPLOSION_ROWS', 0)
+    left = pd.DataFrame({'key': [np.nan] * 300 + [1.0], 'a': 1})
+    right = pd.DataFrame({'key': [np.nan] * 300 + [1.0], 'b': 2})
+    assert len(left.merge(right, on='key')) == 90001
+    prediction = next(message for message, _ in told if 'is estimated to return' in message)
+    assert 'about 90,001 rows' in prediction and '<code>NaN</code> appears about 300 times' in prediction
+    assert 'Missing key values match each other' in prediction
+
+
+def test_merge_key_dtype_mismatch(told):
+    left = pd.DataFrame({'key': ['a', 'b'], 'code': [1, 2]})
+    right = pd.DataFrame({'key': pd.Categorical(['a', 'b']), 'code': ['1', '2']})
+    left.merge(right, on='key')
+    with pytest.raises(ValueError):
+        pd.merge(left, right, on='code')
+    mismatches = [message for message, _ in told if 'Merge key' in message]
+    assert mismatches == [
+        'Merge key <code>key</code> is object on the left and category on the right. pandas has to convert '
+        'the keys to a common type on every merge, which is slow or fails to match equal values. '
+        'Convert one side to the dtype of the other once, before merging',
+        'Merge key <code>code</code> is int64 on the left and object on the right. pandas has to convert '
+        'the keys to a common type on every merge, which is slow or fails to match equal values. '
+        'Convert one side to the dtype of the other once, before merging']
+
+
+def test_groupby_advisor(told, monkeypatch):
+    from dovpanda import config
+    monkeypatch.setattr(config, 'GROUPBY_TIME_THRESHOLD', 0)
+    df = pd.DataFrame({'key': pd.Categorical(['a', 'b'] * 5, categories=['a', 'b', 'c']), 'value': range(10)})
+    grouped = df.groupby('key', observed=True, sort=False)
+    result = grouped.agg(lambda x: x.sum())
+    df.groupby('key').value.apply(lambda x: x.max() - x.min())
+    messages = [message for message, _ in told]
+    assert result['value'].tolist() == [20, 25]
+    assert len(messages) == 3
+    assert 'Use the built-in aggregation instead of a Python function: <code>.sum()</code>' in messages[0]
+    assert 'sort=False' not in messages[0]
+    assert messages[1].startswith('Grouping by categorical <code>key</code> without <code>observed=True</code>')
+    assert 'It calls a Python function for every group' in messages[2] and 'sort=False' in messages[2]
+
+
+def test_groupby_keys_measure_hashing_and_read_observed_defaults(told, monkeypatch):
+    from dovpanda import base, config, core
+    monkeypatch.setattr(config, 'GROUPBY_MIN_ROWS', 100)
+    monkeypatch.setattr(config, 'GROUPBY_TIMING_ROWS', 50)
+    df = pd.DataFrame({'key': pd.Categorical(['a'] * 200, categories=['a', 'b']), 'text': ['x', 'y'] * 100})
+    hint = next(hint for hint in core.ledger.hints['DataFrame.groupby'] if hint.replacement.__name__ == 'groupby_keys')
+    for observed in [core.NO_DEFAULT, False, True]:  # Called directly, as pandas < 2.1 has no such default
+        hint.replacement({'self': df, 'by': ['key', 'text'], 'observed': observed,
+                          '_dovpanda': {'stats': base.CallStats()}})
+    messages = [message for message, _ in told]
+    assert [message.startswith('Grouping by categorical') for message in messages] == [True, False] * 2 + [False]
+    assert re.search(r'strings on every groupby, which takes about \d+ milliseconds here', messages[1])
+
+
+def test_named_aggregations():
+    from dovpanda.core import named_aggregations
+
+    def spread(x):
+        return x.max() - x.min()
+
+    assert named_aggregations(lambda x: len(x)) == 'size'
+    assert named_aggregations({'a': lambda x: np.mean(x), 'b': ['sum', np.max]}) == {'a': 'mean', 'b': ['sum', 'max']}
+    assert named_aggregations([lambda x: x.median(), 'std']) == ['median', 'std']
+    assert named_aggregations([lambda x: x.min(), lambda x: x.max()]) is None  # Can't tell the lambdas apart
+    assert named_aggregations(spread) is None
+    assert named_aggregations(lambda x: np.std(x)) is None
+    assert named_aggregations([sum, np.std]) is None